@@ -0,0 +1,96 @@
+"""
+Grouped statistics over a normalized CarTable.
+
+group_stats() and make_model_stats() walk the table once, bucket every
+numeric field per group, and then sort each bucket once to get count, min,
+max, median and quartiles. Results are cached on the table, so several reports (or several
+views of one report) share the same aggregation.
+"""
+
+from collections import defaultdict
+
+STAT_FIELDS = ("price", "year", "battery_kwh", "mileage_km", "range_km")
+
+
+def percentile(sorted_values, q):
+    """Linear-interpolated percentile (0 <= q <= 1) of an already sorted list"""
+    if not sorted_values:
+        return None
+    pos = (len(sorted_values) - 1) * q
+    lower = int(pos)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    value = sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (pos - lower)
+    # Keep integer columns integral when no interpolation was needed
+    if value == int(value) and isinstance(sorted_values[lower], int):
+        return int(value)
+    return value
+
+
+def summarize(values):
+    """count/min/max/median/p25/p75 of a list of numbers (None already removed)"""
+    values = sorted(values)
+    if not values:
+        return {"count": 0, "min": None, "max": None, "median": None, "p25": None, "p75": None}
+    return {
+        "count": len(values),
+        "min": values[0],
+        "max": values[-1],
+        "median": percentile(values, 0.5),
+        "p25": percentile(values, 0.25),
+        "p75": percentile(values, 0.75),
+    }
+
+
+def _bucket(table, keys, fields):
+    buckets = defaultdict(lambda: {name: [] for name in fields})
+    counts = defaultdict(int)
+    key_columns = [table.column(name) for name in keys]
+    field_columns = [(name, table.column(name)) for name in fields]
+    for i, key in enumerate(zip(*key_columns)):
+        if len(keys) == 1:
+            key = key[0]
+        counts[key] += 1
+        bucket = buckets[key]
+        for name, column in field_columns:
+            value = column[i]
+            if value is not None:
+                bucket[name].append(value)
+    return buckets, counts
+
+
+def _summarize_buckets(buckets, counts, fields):
+    return {
+        key: {"count": counts[key], **{name: summarize(bucket[name]) for name in fields}}
+        for key, bucket in buckets.items()
+    }
+
+
+def group_stats(table, keys=("make", "model"), fields=STAT_FIELDS):
+    """Per-group {count, field: summary} for the given key columns (cached on the table)"""
+    keys, fields = tuple(keys), tuple(fields)
+
+    def compute():
+        return _summarize_buckets(*_bucket(table, keys, fields), fields)
+    return table.cached(("group_stats", keys, fields), compute)
+
+
+def make_model_stats(table, fields=STAT_FIELDS):
+    """(per-make, per-(make, model)) statistics from a single pass over the table.
+
+    The per-make buckets are merged from the per-model ones rather than
+    re-scanning the listings.
+    """
+    fields = tuple(fields)
+
+    def compute():
+        model_buckets, model_counts = _bucket(table, ("make", "model"), fields)
+        make_buckets = defaultdict(lambda: {name: [] for name in fields})
+        make_counts = defaultdict(int)
+        for key, bucket in model_buckets.items():
+            make = key[0]
+            make_counts[make] += model_counts[key]
+            for name in fields:
+                make_buckets[make][name].extend(bucket[name])
+        return (_summarize_buckets(make_buckets, make_counts, fields),
+                _summarize_buckets(model_buckets, model_counts, fields))
+    return table.cached(("make_model_stats", fields), compute)
@@ -0,0 +1,72 @@
+"""
+Atomic file writes.
+
+Every file the scraper, the checkpoints, the caches and the reports produce
+is written to a temporary file next to it and moved into place with
+os.replace(), so a reader (or a resumed run) never sees a half-written file.
+The temporary name carries the thread id, as several workers may write the
+same path at once (cache entries, thumbnails, checkpoint manifests); it
+always ends in ".tmp", which cleanup code can skip or delete.
+"""
+
+import os
+import threading
+from pathlib import Path
+
+import serialization
+
+
+def temp_path(path):
+    path = Path(path)
+    return path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+
+
+class AtomicFile:
+    """File written under a temporary name; close() moves it into place, abort() discards it"""
+
+    def __init__(self, path, mode="w"):
+        self.path = Path(path)
+        self._tmp_path = temp_path(self.path)
+        encoding = None if "b" in mode else "utf-8"
+        self._file = open(self._tmp_path, mode, encoding=encoding)
+
+    def write(self, data):
+        return self._file.write(data)
+
+    def writelines(self, lines):
+        self._file.writelines(lines)
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_atomic(path, data):
+    """Replace `path` with `data` (str or bytes)"""
+    with AtomicFile(path, "wb" if isinstance(data, (bytes, bytearray, memoryview)) else "w") as f:
+        f.write(data)
+    return path
+
+
+def write_json_atomic(path, obj, indent=None):
+    """Replace `path` with `obj` as JSON (serialization.dumps, so compact without an indent)"""
+    return write_atomic(path, serialization.dumps(obj, indent=indent))
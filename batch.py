@@ -0,0 +1,100 @@
+"""
+Batch runs of several named searches in one process.
+
+The searches come from the SEARCHES dict of a config file (config.py by
+default), mapping a name to the selectedFilters of one search. run_batch()
+crawls them concurrently through scrapers derived from one base scraper, so
+they share its connection pool, rate limiter, retry policy and response
+cache. Each search is saved under OUTPUT_DIR/<name>/ with its own filters
+recorded, and the union of all searches is saved once more with listings
+that matched several searches de-duplicated by listing id.
+"""
+
+import re
+import runpy
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import config
+from checkpoint import CrawlCheckpoint, crawl_id
+from listing_index import listing_id
+from rate_control import RateLimiter
+
+# Searches crawled at once by default; they share one rate limit either way
+MAX_WORKERS = 4
+
+_SEARCH_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def load_searches(config_file=None, names=None):
+    """Named searches from a config file (config.py if None), optionally only `names`"""
+    if config_file is None:
+        searches = getattr(config, "SEARCHES", {})
+    else:
+        searches = runpy.run_path(config_file).get("SEARCHES", {})
+    if names:
+        missing = [name for name in names if name not in searches]
+        if missing:
+            raise ValueError(f"Unknown search(es): {', '.join(missing)}")
+        searches = {name: searches[name] for name in names}
+    for name in searches:
+        # Names become directory names under OUTPUT_DIR
+        if not _SEARCH_NAME.match(name):
+            raise ValueError(f"Search name {name!r} may only contain letters, digits, '_' and '-'")
+    return searches
+
+
+def run_batch(scraper, searches, workers=None, delay=1, max_pages=None, fmt="json", indent=2,
+              checkpoint_dir=None, resume=False):
+    """Crawl every named search concurrently and save each one plus their union.
+
+    All searches share the scraper's session and one rate limiter, so `delay`
+    is the minimum interval between any two requests of the batch; `workers`
+    (default: one per search, up to MAX_WORKERS) only sets how many searches
+    are in flight. Returns {name: (filepath or None, listing count)} and the
+    path of the merged file.
+    """
+    if workers is None:
+        workers = min(len(searches), MAX_WORKERS)
+    if scraper.rate_limiter is None:
+        scraper.rate_limiter = RateLimiter(delay)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    extension = "ndjson" if fmt == "ndjson" else "json"
+
+    def crawl(name):
+        search_scraper = scraper.for_filters(searches[name])
+        checkpoint = None
+        if checkpoint_dir is not None:
+            directory = checkpoint_dir / crawl_id(search_scraper.search_payload)
+            if not resume and directory.exists():
+                shutil.rmtree(directory)
+            checkpoint = CrawlCheckpoint(directory, search_scraper.search_payload)
+        listings, total_items = search_scraper.scrape_all_pages(max_pages=max_pages, delay=0,
+                                                                checkpoint=checkpoint)
+        filepath = None
+        if listings:
+            filepath = search_scraper.save_data(listings, f"{name}/bilbasen_cars_{timestamp}.{extension}",
+                                                fmt=fmt, indent=indent)
+        if checkpoint is not None and listings and len(listings) >= (total_items or 0):
+            checkpoint.clear()
+        return search_scraper, listings, filepath
+
+    merged = {}
+    results = {}
+    filters = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for name, (search_scraper, listings, filepath) in zip(searches, pool.map(crawl, searches)):
+            results[name] = (filepath, len(listings))
+            filters[name] = search_scraper.describe_filters()
+            for listing in listings:
+                merged.setdefault(listing_id(listing), listing)
+
+    total = sum(count for _, count in results.values())
+    print(f"Batch of {len(searches)} searches: {total} listings, {len(merged)} unique "
+          f"({total - len(merged)} overlapping)")
+    merged_path = None
+    if merged:
+        merged_path = scraper.save_data(list(merged.values()), f"batch_{timestamp}.{extension}",
+                                        fmt=fmt, indent=indent, filters=filters)
+    return results, merged_path
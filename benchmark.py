@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for the scraper and report pipeline.
+
+For each dataset size a ReplayServer serves synthetic listings scaled from
+demo_data/response.html, and every stage is timed against it:
+
+- scrape:     BilbasenScraper.scrape_all_pages end-to-end over HTTP
+- save_data:  writing the JSON output plus its .columns file
+- normalize:  building the CarTable
+- one step per generate_* report module (build_report)
+
+Each step reports wall time, listings per second and peak traced memory
+(tracemalloc, which slows Python code down, so use --no-memory for pure
+timings). The replay server runs in-process, so its per-page allocations are
+included in the scrape step's peak. Results can be saved with --output and
+checked against an earlier run with --baseline.
+"""
+
+import argparse
+import contextlib
+import gc
+import importlib
+import io
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from build_reports import REPORTS
+from get_cars import BilbasenScraper
+from normalize import normalize_listings
+from replay_server import CAPTURE_FILE, ReplayServer
+from serialization import BACKENDS, set_backend
+
+DEFAULT_SIZES = (1000, 10000)
+
+
+def measure(step, size, fn, memory=True, quiet=True):
+    """Run fn() once; returns (result, {step, listings, seconds, per_second, peak_mb})"""
+    gc.collect()
+    if memory:
+        tracemalloc.start()
+    output = io.StringIO() if quiet else sys.stdout
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(output):
+            result = fn()
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return result, {
+        "step": step,
+        "listings": size,
+        "seconds": round(seconds, 4),
+        "per_second": round(size / seconds, 1) if seconds > 0 else None,
+        "peak_mb": round(peak / (1024 * 1024), 2) if peak is not None else None,
+    }
+
+
+def run_size(size, work_dir, concurrency=4, memory=True, quiet=True, capture=CAPTURE_FILE):
+    """Benchmark every step for one dataset size; returns a list of result dicts"""
+    results = []
+
+    def step(name, fn):
+        result, stats = measure(name, size, fn, memory, quiet)
+        results.append(stats)
+        print(format_result(stats))
+        return result
+
+    with ReplayServer.from_capture(size, capture) as server:
+        scraper = BilbasenScraper(pool_size=concurrency)
+        scraper.base_url = server.url
+        listings, _ = step("scrape", lambda: scraper.scrape_all_pages(delay=0, concurrency=concurrency))
+    if len(listings) != size:
+        print(f"Warning: scraped {len(listings)} of {size} listings")
+
+    step("save_data", lambda: scraper.save_data(listings, work_dir / f"bench_{size}.json"))
+    table = step("normalize", lambda: normalize_listings(listings))
+    for output_name, module_name, _ in REPORTS:
+        module = importlib.import_module(module_name)
+        # Drop aggregates cached by an earlier report so each one pays its own way
+        table._cache.clear()
+        step(module_name, lambda: module.build_report(table, work_dir / output_name, listings))
+    return results
+
+
+def format_result(stats):
+    rate = f"{stats['per_second']:>12,.0f}/s" if stats["per_second"] else f"{'-':>14}"
+    peak = f"{stats['peak_mb']:>9.1f} MB" if stats["peak_mb"] is not None else f"{'-':>12}"
+    return f"{stats['step']:<28} {stats['listings']:>8,} {stats['seconds']:>9.3f}s {rate} {peak}"
+
+
+def compare(results, baseline, tolerance):
+    """Steps that got slower than `baseline` by more than `tolerance` (a fraction)"""
+    previous = {(r["step"], r["listings"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        before = previous.get((result["step"], result["listings"]))
+        if before is None or not before["seconds"]:
+            continue
+        change = result["seconds"] / before["seconds"] - 1
+        if change > tolerance:
+            regressions.append((result, before, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the scraper and report generators offline')
+    parser.add_argument('--sizes', type=str, default=",".join(map(str, DEFAULT_SIZES)),
+                        help='Comma-separated dataset sizes (number of listings), e.g. 1000,10000,100000')
+    parser.add_argument('--concurrency', type=int, default=4, help='Pages fetched in parallel by the scraper')
+    parser.add_argument('--capture', type=str, default=CAPTURE_FILE, help='Captured search page to scale up')
+    parser.add_argument('--json-backend', choices=('auto',) + BACKENDS, default='auto', help='JSON library to benchmark with')
+    parser.add_argument('--no-memory', action='store_true', help='Skip tracemalloc (faster, timings only)')
+    parser.add_argument('--verbose', action='store_true', help='Show the output of each step')
+    parser.add_argument('--output', type=str, help='Write results as JSON to this file')
+    parser.add_argument('--baseline', type=str, help='Earlier --output file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed slowdown against the baseline before failing (0.25 = 25%%)')
+    args = parser.parse_args()
+    set_backend(args.json_backend)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    print(f"{'step':<28} {'listings':>8} {'time':>10} {'throughput':>14} {'peak mem':>12}")
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bilbasen_bench_") as work_dir:
+        for size in sizes:
+            results.extend(run_size(size, Path(work_dir), args.concurrency, not args.no_memory,
+                                    not args.verbose, args.capture))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "memory": not args.no_memory,
+                       "json_backend": args.json_backend, "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("memory") != (not args.no_memory):
+            # tracemalloc slows every step several times over
+            sys.exit("Baseline was run with a different --no-memory setting; timings are not comparable")
+        regressions = compare(results, baseline, args.tolerance)
+        for result, before, change in regressions:
+            print(f"REGRESSION {result['step']} @ {result['listings']:,}: "
+                  f"{before['seconds']:.3f}s -> {result['seconds']:.3f}s (+{change:.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No step slower than the baseline by more than {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
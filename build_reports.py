@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Build every HTML report from one load of the scraped data.
+
+The dataset is read and normalized once and each report is rendered from
+that shared table, optionally in parallel worker processes. A report is
+skipped when neither the input data nor its generator (with every local
+module it imports, directly or not) changed since it was last built
+(tracked in .build_manifest.json next to the reports).
+
+With --thumbnails, model photos are downloaded once into a local thumbnail
+cache next to the reports and the reports link to those instead of the
+full-size images on billeder.bilbasen.dk.
+"""
+
+import argparse
+import ast
+import hashlib
+import importlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import serialization
+from atomic_write import write_json_atomic
+from columnar import load_car_table
+from normalize import normalize_listings
+from thumbnails import Image, ThumbnailCache, localize_images
+
+# output file, generator module, whether it needs the raw listings too
+REPORTS = [
+    ("bilbasen_stats.html", "generate_stats_html", False),
+    ("bilbasen_stats_table.html", "generate_stats_table", False),
+    ("bilbasen_comparison_table.html", "generate_comparison_table", True),
+]
+
+MANIFEST_FILE = ".build_manifest.json"
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_manifest(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_manifest(path, manifest):
+    write_json_atomic(path, manifest, indent=2)
+
+
+def local_sources(module_name, root=Path(__file__).parent):
+    """Source files of `module_name` and of every module in `root` it imports, transitively"""
+    found = {}
+    pending = [module_name]
+    while pending:
+        name = pending.pop()
+        path = root / f"{name}.py"
+        if name in found or not path.exists():
+            continue
+        found[name] = path
+        tree = ast.parse(path.read_text(encoding="utf-8"))
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                pending.extend(alias.name.split(".")[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                pending.append(node.module.split(".")[0])
+    return [found[name] for name in sorted(found)]
+
+
+def report_fingerprint(module_name, data_digest):
+    # The generator and everything it (or this build script) imports from the repo
+    sources = set(local_sources(module_name)) | set(local_sources(Path(__file__).stem))
+    h = hashlib.sha256(data_digest.encode())
+    for source in sorted(sources):
+        h.update(source.name.encode())
+        h.update(file_digest(source).encode())
+    return h.hexdigest()
+
+
+def render_report(module_name, output_file, table, listings):
+    module = importlib.import_module(module_name)
+    module.build_report(table, output_file, listings)
+    return output_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build all Bilbasen HTML reports')
+    parser.add_argument('--data', type=str, default='data/latest_cars.json', help='Scraped data file')
+    parser.add_argument('--output-dir', type=str, default='.', help='Directory to write the reports to')
+    parser.add_argument('--only', action='append', help='Build only this report (may be repeated)')
+    parser.add_argument('--jobs', type=int, default=1, help='Render reports in this many processes')
+    parser.add_argument('--force', action='store_true', help='Rebuild even if inputs are unchanged')
+    parser.add_argument('--thumbnails', action='store_true', help='Link local thumbnails instead of full-size remote photos')
+    parser.add_argument('--thumb-dir', type=str, default='thumbs', help='Thumbnail cache directory, relative to --output-dir')
+    parser.add_argument('--thumb-size', type=int, nargs=2, default=[320, 240], metavar=('W', 'H'), help='Maximum thumbnail size (needs Pillow)')
+    parser.add_argument('--thumb-cache-mb', type=float, default=100, help='Size cap for the thumbnail cache')
+    parser.add_argument('--thumb-workers', type=int, default=8, help='Images downloaded in parallel')
+    args = parser.parse_args()
+
+    json_file = Path(args.data)
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / MANIFEST_FILE
+    manifest = load_manifest(manifest_path)
+
+    data_digest = file_digest(json_file)
+    if args.thumbnails:
+        # Local image links change the output, so they are part of the fingerprint
+        data_digest += f":thumbnails:{args.thumb_dir}:{args.thumb_size[0]}x{args.thumb_size[1]}"
+    pending = []
+    for output_name, module_name, needs_listings in REPORTS:
+        if args.only and output_name not in args.only:
+            continue
+        output_file = output_dir / output_name
+        fingerprint = report_fingerprint(module_name, data_digest)
+        if not args.force and output_file.exists() and manifest.get(output_name) == fingerprint:
+            print(f"{output_name} is up to date, skipping")
+            continue
+        pending.append((output_name, module_name, needs_listings, output_file, fingerprint))
+
+    if not pending:
+        print("All reports are up to date.")
+        return
+
+    print(f"Loading data from {json_file}")
+    listings = None
+    if any(needs_listings for _, _, needs_listings, _, _ in pending):
+        listings = serialization.load_file(json_file).get("listings", [])
+        table = normalize_listings(listings)
+    else:
+        table = load_car_table(json_file)
+
+    if args.thumbnails:
+        if Image is None:
+            print("Warning: Pillow is not installed, so --thumbnails keeps the original photos "
+                  "and ignores --thumb-size (pip install Pillow)")
+        cache = ThumbnailCache(output_dir / args.thumb_dir, size=tuple(args.thumb_size),
+                               max_bytes=int(args.thumb_cache_mb * 1024 * 1024),
+                               workers=args.thumb_workers)
+        localized = localize_images(table, cache, output_dir)
+        print(f"Using {localized} local thumbnails: {cache.stats()}")
+
+    try:
+        if args.jobs > 1 and len(pending) > 1:
+            with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+                jobs = []
+                for output_name, module_name, needs_listings, output_file, fingerprint in pending:
+                    future = pool.submit(render_report, module_name, str(output_file), table,
+                                         listings if needs_listings else None)
+                    jobs.append((output_name, fingerprint, future))
+                for output_name, fingerprint, future in jobs:
+                    future.result()
+                    manifest[output_name] = fingerprint
+        else:
+            for output_name, module_name, needs_listings, output_file, fingerprint in pending:
+                render_report(module_name, str(output_file), table, listings if needs_listings else None)
+                manifest[output_name] = fingerprint
+    finally:
+        # Record whatever was built, even if a later report failed
+        save_manifest(manifest_path, manifest)
+    print(f"Built {len(pending)} report(s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Crawl checkpoints for resumable scrapes.
+
+Every fetched page is written atomically to its own file under
+data/checkpoints/<crawl id>/, and manifest.json records which pages are done.
+The crawl id is a hash of the search payload, so a re-run of the same search
+(or the same shard) finds its earlier pages and only fetches the rest. Once
+a crawl has collected everything it reported, mark_complete() records that
+with the total, and a resumed run takes its listings straight from the
+saved pages (see sharding.scrape_shards).
+"""
+
+import hashlib
+import json
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import serialization
+from atomic_write import write_json_atomic
+from listing_index import listing_id
+
+
+def crawl_id(search_payload):
+    payload = {k: v for k, v in search_payload.items() if k != "page"}
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+class CrawlCheckpoint:
+    def __init__(self, directory, search_payload=None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.directory / "manifest.json"
+        self._lock = threading.Lock()
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.manifest = {
+                "started_at": datetime.now().isoformat(),
+                "search_payload": search_payload,
+                "completed_pages": [],
+                "complete": False,
+            }
+        self._completed = set(self.manifest["completed_pages"])
+
+    @classmethod
+    def for_search(cls, root, search_payload):
+        """Checkpoint directory for one search under `root` (e.g. data/checkpoints)"""
+        return cls(Path(root) / crawl_id(search_payload), search_payload)
+
+    def _page_path(self, page):
+        return self.directory / f"page_{page:05d}.json"
+
+    @property
+    def completed_pages(self):
+        return sorted(self._completed)
+
+    @property
+    def complete(self):
+        return self.manifest.get("complete", False)
+
+    def has_page(self, page):
+        return page in self._completed
+
+    def load_page(self, page):
+        return serialization.load_file(self._page_path(page))
+
+    def save_page(self, page, data):
+        """Persist one page response, then record it in the manifest"""
+        write_json_atomic(self._page_path(page), data)
+        with self._lock:
+            self._completed.add(page)
+            self.manifest["completed_pages"] = sorted(self._completed)
+            self.manifest["updated_at"] = datetime.now().isoformat()
+            write_json_atomic(self.manifest_path, self.manifest)
+
+    @property
+    def total_items(self):
+        return self.manifest.get("total_items")
+
+    def mark_complete(self, total_items=None):
+        with self._lock:
+            self.manifest["complete"] = True
+            self.manifest["total_items"] = total_items
+            write_json_atomic(self.manifest_path, self.manifest)
+
+    def listings(self):
+        """Listings of every saved page, in page order, de-duplicated by id"""
+        unique = {}
+        for page in self.completed_pages:
+            for listing in self.load_page(page).get("listings", []):
+                unique.setdefault(listing_id(listing), listing)
+        return list(unique.values())
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
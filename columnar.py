@@ -0,0 +1,178 @@
+"""
+Compact columnar file format for normalized listings.
+
+Layout of a .columns file:
+
+    b"BBCOL1\\n"
+    4-byte little-endian header length
+    JSON header: row count and, per column, its type and byte range
+    column data, each column 8-byte aligned
+
+Numeric columns are raw little-endian int64 ("int") or float64 ("float")
+arrays, with INT_NULL / NaN standing in for missing values. String columns
+are dictionary encoded: an int32 code per row (-1 for None) plus the
+distinct values as a JSON list.
+
+The file is memory-mapped on read and only the requested columns are
+decoded, so loading a few columns of a full-market dataset is cheap.
+"""
+
+import json
+import math
+import mmap
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+import serialization
+from atomic_write import AtomicFile
+from normalize import COLUMNS, NUMERIC_COLUMNS, CarTable, normalize_listings
+
+MAGIC = b"BBCOL1\n"
+INT_NULL = -(2 ** 63)
+FLOAT_COLUMNS = ("battery_kwh",)
+
+COLUMN_TYPES = {
+    name: ("float" if name in FLOAT_COLUMNS else "int" if name in NUMERIC_COLUMNS else "str")
+    for name in COLUMNS
+}
+
+
+def _to_little_endian(arr):
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr
+
+
+def _encode_column(kind, values):
+    if kind == "int":
+        arr = array("q", (INT_NULL if v is None else int(v) for v in values))
+        return _to_little_endian(arr).tobytes(), None
+    if kind == "float":
+        arr = array("d", (math.nan if v is None else float(v) for v in values))
+        return _to_little_endian(arr).tobytes(), None
+    codes = array("i")
+    dictionary = {}
+    for v in values:
+        if v is None:
+            codes.append(-1)
+        else:
+            codes.append(dictionary.setdefault(v, len(dictionary)))
+    return _to_little_endian(codes).tobytes(), list(dictionary)
+
+
+def write_columnar(table, path, extra_columns=None):
+    """Write a CarTable to `path` (atomically, via a temp file).
+
+    `extra_columns` maps further column names to lists of strings stored
+    alongside the table's columns (e.g. listing ids).
+    """
+    path = Path(path)
+    blobs = []
+    header = {"rows": len(table), "columns": []}
+    offset = 0
+    columns = [(name, COLUMN_TYPES[name], table.column(name)) for name in COLUMNS]
+    columns += [(name, "str", values) for name, values in (extra_columns or {}).items()]
+    for name, kind, values in columns:
+        data, dictionary = _encode_column(kind, values)
+        entry = {"name": name, "type": kind, "offset": offset, "length": len(data)}
+        if dictionary is not None:
+            entry["dictionary"] = dictionary
+        header["columns"].append(entry)
+        padding = -len(data) % 8
+        blobs.append(data + b"\0" * padding)
+        offset += len(data) + padding
+
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    # Pad the header so column data starts 8-byte aligned
+    prefix_len = len(MAGIC) + 4 + len(header_bytes)
+    header_bytes += b" " * (-prefix_len % 8)
+
+    with AtomicFile(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        for blob in blobs:
+            f.write(blob)
+    return path
+
+
+class ColumnarFile:
+    """Memory-mapped reader; columns are decoded on first access"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a columnar listings file")
+        (header_len,) = struct.unpack_from("<I", self._map, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = json.loads(self._map[start:start + header_len])
+        self._data_start = start + header_len
+        self._columns = {c["name"]: c for c in self.header["columns"]}
+        self.rows = self.header["rows"]
+
+    @property
+    def column_names(self):
+        return list(self._columns)
+
+    def column(self, name):
+        """Decode one column into a list, with None for missing values"""
+        entry = self._columns[name]
+        begin = self._data_start + entry["offset"]
+        raw = self._map[begin:begin + entry["length"]]
+        kind = entry["type"]
+        if kind == "int":
+            arr = _to_little_endian(array("q", raw))
+            return [None if v == INT_NULL else v for v in arr]
+        if kind == "float":
+            arr = _to_little_endian(array("d", raw))
+            return [None if v != v else v for v in arr]
+        codes = _to_little_endian(array("i", raw))
+        dictionary = entry["dictionary"]
+        return [None if c < 0 else dictionary[c] for c in codes]
+
+    def to_table(self, columns=None):
+        """CarTable with the requested columns filled in (others left empty)"""
+        table = CarTable()
+        for name in columns or [name for name in self.column_names if name in COLUMNS]:
+            setattr(table, name, self.column(name))
+        if columns:
+            # Keep len(table) meaningful when "make" was not requested
+            for name in COLUMNS:
+                if name not in columns:
+                    setattr(table, name, [None] * self.rows)
+        return table
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_columnar(path, columns=None):
+    with ColumnarFile(path) as f:
+        return f.to_table(columns)
+
+
+def columnar_path(json_path):
+    """data/latest_cars.json -> data/latest_cars.columns"""
+    json_path = Path(json_path)
+    return json_path.with_name(json_path.name.split(".")[0] + ".columns")
+
+
+def load_car_table(json_file, columns=None):
+    """Load normalized listings, preferring an up-to-date .columns file"""
+    col_file = columnar_path(json_file)
+    if col_file.exists() and col_file.stat().st_mtime >= Path(json_file).stat().st_mtime:
+        return read_columnar(col_file, columns)
+    data = serialization.load_file(json_file)
+    return normalize_listings(data.get("listings", []))
@@ -0,0 +1,243 @@
+"""
+Memory-lean listing storage for large crawls.
+
+A raw listing from the API is a nest of dicts and strings worth tens of
+kilobytes in memory; the reports read about a dozen normalized fields of it.
+
+CompactTable keeps the normalized CarTable columns in typed arrays, the same
+encodings as a .columns file: integers as int64 with a null sentinel,
+battery_kwh as float64 (NaN for None), repeated strings (make, model,
+variant, gear, fuel) as int32 codes into one shared dictionary per column,
+and the per-listing URLs as UTF-8 bytes in one buffer, minus their common
+Bilbasen prefix. A row then costs a fixed 92 bytes plus its two URLs,
+instead of a dict per listing. column()/to_table() decode back to lists
+for the report code, and write_columnar() accepts a CompactTable directly.
+
+RawSpill keeps raw listings on disk instead of in memory: each listing is
+appended to a temporary NDJSON file and only its offset is held, so the raw
+payload can still be saved or inspected later, one slice at a time.
+"""
+
+import math
+import os
+import tempfile
+from array import array
+
+import serialization
+from columnar import COLUMN_TYPES, INT_NULL
+from normalize import COLUMNS, CarTable, normalize_listings
+
+# Per-listing strings, stored as bytes with a common prefix stripped
+TEXT_PREFIXES = {
+    "uri": "https://www.bilbasen.dk/brugt/bil/",
+    "image_url": "https://billeder.bilbasen.dk/bilinfo/",
+}
+_PREFIXED = 0x01
+
+
+class _TextColumn:
+    __slots__ = ("prefix", "data", "starts")
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.data = bytearray()
+        # Start offset of each value in data, -1 for None; a value ends where the next one starts
+        self.starts = array("q")
+
+    def append(self, value):
+        if value is None:
+            self.starts.append(-1)
+            return
+        self.starts.append(len(self.data))
+        if value.startswith(self.prefix):
+            self.data.append(_PREFIXED)
+            value = value[len(self.prefix):]
+        self.data += value.encode("utf-8")
+
+    def values(self):
+        out = []
+        starts = self.starts
+        # Walk backwards so each value ends where the previous (non-null) one started
+        end = len(self.data)
+        for i in range(len(starts) - 1, -1, -1):
+            start = starts[i]
+            if start < 0:
+                out.append(None)
+                continue
+            raw = self.data[start:end]
+            end = start
+            if raw[:1] == b"\x01":
+                out.append(self.prefix + raw[1:].decode("utf-8"))
+            else:
+                out.append(raw.decode("utf-8"))
+        out.reverse()
+        return out
+
+    def nbytes(self):
+        return len(self.data) + self.starts.itemsize * len(self.starts)
+
+
+class _CodedColumn:
+    __slots__ = ("codes", "dictionary", "index")
+
+    def __init__(self):
+        self.codes = array("i")
+        self.dictionary = []
+        self.index = {}
+
+    def append(self, value):
+        if value is None:
+            self.codes.append(-1)
+            return
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.dictionary)
+            self.dictionary.append(value)
+        self.codes.append(code)
+
+    def values(self):
+        dictionary = self.dictionary
+        return [None if c < 0 else dictionary[c] for c in self.codes]
+
+    def nbytes(self):
+        # Dictionary strings are shared by every row, so they count once
+        return (self.codes.itemsize * len(self.codes)
+                + sum(len(v.encode("utf-8")) + 49 for v in self.dictionary))
+
+
+class _NumberColumn:
+    __slots__ = ("values_", "kind")
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.values_ = array("d") if kind == "float" else array("q")
+
+    def append(self, value):
+        if self.kind == "float":
+            self.values_.append(math.nan if value is None else float(value))
+        else:
+            self.values_.append(INT_NULL if value is None else int(value))
+
+    def values(self):
+        if self.kind == "float":
+            return [None if v != v else v for v in self.values_]
+        return [None if v == INT_NULL else v for v in self.values_]
+
+    def nbytes(self):
+        return self.values_.itemsize * len(self.values_)
+
+
+class CompactTable:
+    """Append-only normalized listings in typed arrays (see module docstring)"""
+
+    def __init__(self):
+        self._columns = {}
+        for name in COLUMNS:
+            if name in TEXT_PREFIXES:
+                self._columns[name] = _TextColumn(TEXT_PREFIXES[name])
+            elif COLUMN_TYPES[name] == "str":
+                self._columns[name] = _CodedColumn()
+            else:
+                self._columns[name] = _NumberColumn(COLUMN_TYPES[name])
+        self._rows = 0
+
+    def __len__(self):
+        return self._rows
+
+    def extend(self, listings):
+        """Normalize raw listings and append them"""
+        return self.extend_table(normalize_listings(listings))
+
+    def extend_table(self, table):
+        """Append the rows of a CarTable"""
+        for name, column in self._columns.items():
+            append = column.append
+            for value in table.column(name):
+                append(value)
+        self._rows += len(table)
+        return self
+
+    def column(self, name):
+        """One column decoded into a list, with None for missing values"""
+        return self._columns[name].values()
+
+    def to_table(self, columns=None):
+        """CarTable with the requested columns filled in (others left as None)"""
+        table = CarTable()
+        for name in COLUMNS:
+            if columns is None or name in columns:
+                setattr(table, name, self.column(name))
+            else:
+                setattr(table, name, [None] * self._rows)
+        return table
+
+    def nbytes(self):
+        """Approximate memory held by the column data"""
+        return sum(column.nbytes() for column in self._columns.values())
+
+
+class RawSpill:
+    """Raw listings appended to a temporary NDJSON file, read back on demand.
+
+    Behaves as a read-only sequence (len, indexing, slicing, iteration) with
+    an extend() for appending, so it can stand in for a list of listings.
+    The file is deleted by close().
+    """
+    CHUNK = 500
+
+    def __init__(self, directory=None):
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(prefix="listings_", suffix=".ndjson.spill", dir=directory)
+        self._file = os.fdopen(fd, "w+b")
+        # End offset of each listing's line
+        self._ends = array("q")
+
+    def __len__(self):
+        return len(self._ends)
+
+    def extend(self, listings):
+        self._file.seek(0, os.SEEK_END)
+        for listing in listings:
+            self._file.write(serialization.dumps(listing).encode("utf-8") + b"\n")
+            self._ends.append(self._file.tell())
+
+    def _read(self, start, stop):
+        if start >= stop:
+            return []
+        begin = self._ends[start - 1] if start else 0
+        self._file.flush()
+        self._file.seek(begin)
+        data = self._file.read(self._ends[stop - 1] - begin)
+        return [serialization.loads(line) for line in data.splitlines()]
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return self._read(start, stop)
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("RawSpill index out of range")
+        return self._read(item, item + 1)[0]
+
+    def __iter__(self):
+        for start in range(0, len(self), self.CHUNK):
+            yield from self._read(start, min(start + self.CHUNK, len(self)))
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -2,7 +2,7 @@
 
 # Search filters - modify these to change what cars to scrape
 SEARCH_FILTERS = {
-    "pageSize": 30,
+    "pageSize": 100,
     "selectedFilters": {
         "Ownership": {
             "value": {
@@ -16,37 +16,65 @@ SEARCH_FILTERS = {
         },
         "PriceRange": {
             "value": {
-                "fromValue": 250000,  # Minimum price in kr
+                "fromValue": 100000,  # Minimum price in kr
                 "toValue": 300000     # Maximum price in kr
             }
         },
         "FirstRegistration": {
             "value": {
-                "fromValue": 2024  # Minimum registration year
+                "fromValue": 2020  # Minimum registration year
             }
         },
-        "FuelType": {
+        # "FuelType": {
+        #     "values": [
+        #         {
+        #             "value": "Electric"  # Options: "Electric", "Petrol", "Diesel", etc.
+        #         }
+        #     ]
+        # },
+        "InteriorComfortEquipments": {
             "values": [
                 {
-                    "value": "Electric"  # Options: "Electric", "Petrol", "Diesel", etc.
+                    "value": "HeadupDisplay"
                 }
             ]
         },
-        "Model":{
-            "values":[
-                {
-                    "parent": {"key":"Make","value":"Mercedes"},
-                    "values": ["ms-EQB-Klasse"]
-                }
-            ]
-        }
+        # "DriveWheel": {"values": [{"value": "Four"}]},
+        # "Make": {"values": [{"value": "Mercedes"}]},
+        # "Model": {
+        #     "values": [
+        #         {
+        #             "parent": {"key": "Make", "value": "Mercedes"},
+        #             "values": ["ms-EQB-Klasse"]
+        #         }
+        #     ]
+        # }
     }
 }
 
+# Named searches for batch runs (run_scraper.py --batch). Each entry holds the
+# selectedFilters of one search; all of them run in one process, sharing the
+# connection pool and request rate. Results go to OUTPUT_DIR/<name>/.
+SEARCHES = {
+    "electric": {
+        "Ownership": {"value": {"value": "Retail"}},
+        "Category": {"value": {"value": "Car"}},
+        "PriceRange": {"value": {"fromValue": 250000, "toValue": 300000}},
+        "FirstRegistration": {"value": {"fromValue": 2024}},
+        "FuelType": {"values": [{"value": "Electric"}]},
+    },
+    "mercedes_eqb": {
+        "Ownership": {"value": {"value": "Retail"}},
+        "Category": {"value": {"value": "Car"}},
+        "Model": {"values": [{"parent": {"key": "Make", "value": "Mercedes"}, "values": ["ms-EQB-Klasse"]}]},
+    },
+}
+
 # Scraping settings
 DELAY_BETWEEN_REQUESTS = 1  # seconds
 MAX_PAGES = None  # Set to a number to limit pages, None for all pages
+CONCURRENCY = 1  # Pages fetched in parallel; above 1 the delay becomes a shared rate limit
 TIMEOUT = 30  # Request timeout in seconds
 
 # Output settings
-OUTPUT_DIR = "data"
\ No newline at end of file
+OUTPUT_DIR = "data"
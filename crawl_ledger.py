@@ -0,0 +1,89 @@
+"""
+In-crawl identity index and page drift detection.
+
+Search results move while a crawl pages through them. A new ad near the top
+pushes every later listing down, so the last listing of page p shows up
+again as the first of page p+1. A sold car pulls them up, so the first
+listing of page p+1 slides onto page p after that page was fetched and is
+never seen at all.
+
+CrawlLedger keys every listing on its id as pages arrive, so repeats are
+dropped instead of collected, and completeness is judged on unique ids. It
+also notes the pages where the result set visibly moved:
+
+- the page repeats ids first seen on another page (listings pushed down);
+- the page reports a different numItems than the page before it (listings
+  added or removed in between).
+
+A listing can only slip past a page boundary next to such a page, so
+refetch_pages() names just the window around each drift (the page and the
+one before it) to fetch again. Listings added above those pages are only
+found further back, so while unique ids stay short of the latest numItems
+it keeps stepping back one page at a time, but at most `walk_back` pages
+below the first drift; a crawl that moved further than that is better
+repeated than re-fetched page by page.
+
+Refetched pages are recorded with refetch=True: listings seen again there
+are expected, so they neither count as duplicates nor mark new drift.
+"""
+
+from listing_index import listing_id
+
+
+class CrawlLedger:
+    def __init__(self, walk_back=2):
+        self.walk_back = walk_back
+        self.first_page = {}
+        self.duplicates = 0
+        self.total_items = None
+        self.drift_pages = set()
+        self.refetched = set()
+
+    def __len__(self):
+        return len(self.first_page)
+
+    def add_page(self, page, listings, total_items=None, refetch=False):
+        """Record one page; returns the listings whose ids were not seen before"""
+        new = []
+        moved = 0
+        for listing in listings:
+            lid = listing_id(listing)
+            seen_on = self.first_page.get(lid)
+            if seen_on is None:
+                self.first_page[lid] = page
+                new.append(listing)
+            elif seen_on != page:
+                moved += 1
+        # Repeats from the same page only mean the page was fetched again
+        if moved and not refetch:
+            self.duplicates += moved
+            self.drift_pages.add(page)
+        if total_items is not None:
+            if self.total_items is not None and total_items != self.total_items and not refetch:
+                self.drift_pages.add(page)
+            self.total_items = total_items
+        return new
+
+    def missing(self):
+        """Unique listings still short of the latest reported total (0 if unknown)"""
+        if not self.total_items:
+            return 0
+        return max(self.total_items - len(self), 0)
+
+    def refetch_pages(self):
+        """Pages to fetch again, in page order.
+
+        First the window around each drift not handled yet; once those are
+        done, one page further back per call, for listings that were added
+        above the pages that showed the drift, down to `walk_back` pages
+        below the first drift window. Empty once that is exhausted.
+        """
+        pages = {p for page in self.drift_pages for p in (page - 1, page) if p >= 1}
+        pages -= self.refetched
+        if not pages and self.refetched:
+            low = min(self.refetched)
+            floor = max(min(self.drift_pages) - 1 - self.walk_back, 1)
+            if low > floor:
+                pages = {low - 1}
+        self.refetched |= pages
+        return sorted(pages)
@@ -1,101 +1,39 @@
-import json
 import os
 import glob
-from collections import defaultdict, Counter
 from datetime import datetime
 
+import serialization
+from html_render import HtmlStream, Template, fmt_value
+from normalize import normalize_listings
+from spec_groups import FieldCardinality, SpecGrouper
+
 def load_latest_json(data_dir="data"):
     files = sorted(glob.glob(os.path.join(data_dir, "latest_cars.json")), reverse=True)
     if not files:
         raise FileNotFoundError("No bilbasen_cars_*.json files found in data directory.")
     return files[0]
 
-def extract_relevant_specs(listings):
-    # Most relevant fields for electric cars
-    cars = []
-    for car in listings:
-        make = car.get("make", "Unknown")
-        model = car.get("model", "Unknown")
-        variant = car.get("variant", "")
-        price = car.get("price", {}).get("price", None)
-        reg_date = car.get("properties", {}).get("firstregistrationdate", {}).get("displayTextShort", "")
-        year = None
-        if reg_date:
-            try:
-                year = int(reg_date.split("/")[-1]) if "/" in reg_date else int(reg_date)
-            except Exception:
-                year = None
-        battery = car.get("properties", {}).get("batterycapacity", {}).get("displayTextShort", "")
-        battery_kwh = None
-        if battery:
-            try:
-                battery_kwh = float(battery.split()[0].replace(",", "."))
-            except Exception:
-                battery_kwh = None
-        mileage = car.get("properties", {}).get("mileage", {}).get("displayTextShort", "")
-        mileage_km = None
-        if mileage:
-            try:
-                mileage_km = int(mileage.replace(" km", "").replace(".", ""))
-            except Exception:
-                mileage_km = None
-        electric_range = car.get("properties", {}).get("electricmotorrange", {}).get("displayTextShort", "")
-        range_km = None
-        if electric_range:
-            try:
-                range_km = int(electric_range.replace(" km", "").replace(".", ""))
-            except Exception:
-                range_km = None
-        doors = car.get("doors", None)
-        power = car.get("properties", {}).get("hk", {}).get("displayTextShort", "")
-        power_hk = None
-        if power:
-            try:
-                power_hk = int(power.split()[0])
-            except Exception:
-                power_hk = None
-        gear = car.get("properties", {}).get("geartype", {}).get("displayTextShort", "")
-        fuel = car.get("properties", {}).get("fueltype", {}).get("displayTextShort", "")
-        uri = car.get("uri", "")
-        cars.append({
-            "make": make,
-            "model": model,
-            "variant": variant,
-            "battery_kwh": battery_kwh,
-            "power_hk": power_hk,
-            "range_km": range_km,
-            "doors": doors,
-            "gear": gear,
-            "fuel": fuel,
-            "price": price,
-            "year": year,
-            "mileage_km": mileage_km,
-            "uri": uri
-        })
-    return cars
-
-def group_cars(cars):
+def group_cars(table):
     # Group by all fields except price, year, mileage, uri
-    groups = defaultdict(list)
-    for car in cars:
-        key = (
-            car["make"], car["model"], car["variant"], car["battery_kwh"],
-            car["power_hk"], car["range_km"], car["doors"], car["gear"], car["fuel"]
-        )
-        groups[key].append(car)
-    return groups
+    return SpecGrouper().update(table).groups
+
+# Raw listing fields suggested as extra columns when they vary
+EXTRA_FIELDS = ["description", "location", "trailer", "moth", "kmt", "features"]
 
-def html_escape(text):
-    return (str(text)
-            .replace("&", "&amp;")
-            .replace("<", "&lt;")
-            .replace(">", "&gt;")
-            .replace('"', "&quot;")
-            .replace("'", "&#39;"))
+CELL_TEMPLATE = Template("<td>{value}</td>")
+LINK_TEMPLATE = Template('<a href="{uri}" target="_blank">Link</a>')
+RECOMMENDATION_TEMPLATE = Template("<li>Consider adding <b>{field}</b> (has {count} unique values)</li>")
 
-def generate_html(groups, output_file, all_cars):
+def range_cell(low, high, spec=""):
+    if low is None:
+        return '<td>N/A</td>'
+    if low != high:
+        return CELL_TEMPLATE.render(value=f"{low:{spec}} - {high:{spec}}")
+    return CELL_TEMPLATE.render(value=format(low, spec))
+
+def generate_html(groups, output_file, field_counts):
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    html = [f"""
+    head = f"""
     <html>
     <head>
         <meta charset='utf-8'>
@@ -155,77 +93,45 @@ def generate_html(groups, output_file, all_cars):
                 </tr>
             </thead>
             <tbody>
-    """]
-    for key, cars in groups.items():
-        prices = [c["price"] for c in cars if c["price"] is not None]
-        years = [c["year"] for c in cars if c["year"] is not None]
-        mileages = [c["mileage_km"] for c in cars if c["mileage_km"] is not None]
-        html.append("<tr>")
-        for v in key:
-            html.append(f'<td>{html_escape(v) if v is not None else "N/A"}</td>')
-        # Price range
-        if prices:
-            html.append(f'<td>{min(prices):,} - {max(prices):,}</td>' if min(prices)!=max(prices) else f'<td>{min(prices):,}</td>')
-        else:
-            html.append('<td>N/A</td>')
-        # Year range
-        if years:
-            html.append(f'<td>{min(years)} - {max(years)}</td>' if min(years)!=max(years) else f'<td>{min(years)}</td>')
-        else:
-            html.append('<td>N/A</td>')
-        # Mileage range
-        if mileages:
-            html.append(f'<td>{min(mileages):,} - {max(mileages):,}</td>' if min(mileages)!=max(mileages) else f'<td>{min(mileages):,}</td>')
-        else:
-            html.append('<td>N/A</td>')
-        # Listing links
-        html.append('<td class="listing-links">' + ' '.join(f'<a href="{html_escape(c["uri"])}" target="_blank">Link</a>' for c in cars) + '</td>')
-        # Count
-        html.append(f'<td>{len(cars)}</td>')
-        html.append("</tr>")
-    html.append("""
+    """
+    with HtmlStream(output_file) as out:
+        out.line(head)
+        for key, group in groups.items():
+            out.line("<tr>")
+            for v in key:
+                out.line(CELL_TEMPLATE.render(value=fmt_value(v)))
+            out.line(range_cell(group.price_min, group.price_max, ","))
+            out.line(range_cell(group.year_min, group.year_max))
+            out.line(range_cell(group.mileage_min, group.mileage_max, ","))
+            # Listing links
+            out.line('<td class="listing-links">' + ' '.join(LINK_TEMPLATE.render(uri=uri) for uri in group.uris) + '</td>')
+            # Count
+            out.line(f'<td>{group.count}</td>')
+            out.line("</tr>")
+        out.line("""
             </tbody>
         </table>
     </div>
     """)
-    # Recommend other specs if they have high variability
-    # Find all possible extra fields
-    extra_fields = [
-        "description", "location", "trailer", "moth", "kmt", "features"
-    ]
-    # Count how many unique values for each extra field
-    field_counts = {}
-    for field in extra_fields:
-        values = set()
-        for car in all_cars:
-            val = car.get(field)
-            if isinstance(val, dict):
-                val = tuple(val.items())
-            if isinstance(val, list):
-                val = tuple(val)
-            if val:
-                values.add(val)
-        field_counts[field] = len(values)
-    html.append("<div style='margin-top:2em;'><h2>Recommendation</h2><ul>")
-    for field, count in field_counts.items():
-        if count > 1:
-            html.append(f"<li>Consider adding <b>{field}</b> (has {count} unique values)</li>")
-    html.append("</ul></div>")
-    html.append("</body></html>")
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write("\n".join(html))
+        # Recommend other specs if they have high variability
+        out.line("<div style='margin-top:2em;'><h2>Recommendation</h2><ul>")
+        for field, count in field_counts.items():
+            if count > 1:
+                out.line(RECOMMENDATION_TEMPLATE.render(field=field, count=count))
+        out.line("</ul></div>")
+        out.write("</body></html>")
     print(f"Comparison table written to {output_file}")
 
+def build_report(table, output_file, listings):
+    """Render the comparison table; raw listings feed the recommendation block"""
+    field_counts = FieldCardinality(EXTRA_FIELDS).update(listings).counts()
+    generate_html(group_cars(table), output_file, field_counts)
+
 def main():
     json_file = load_latest_json()
     print(f"Loading data from {json_file}")
-    with open(json_file, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    listings = data.get("listings", [])
-    cars = extract_relevant_specs(listings)
-    groups = group_cars(cars)
-    output_file = "bilbasen_comparison_table.html"
-    generate_html(groups, output_file, listings)
+    listings = serialization.load_file(json_file).get("listings", [])
+    build_report(normalize_listings(listings), "bilbasen_comparison_table.html", listings)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,82 +1,58 @@
-import json
 import os
 import glob
 from collections import defaultdict
 from pathlib import Path
 from datetime import datetime
 
+from aggregates import make_model_stats
+from columnar import load_car_table
+from html_render import HtmlStream, Template, fmt_value
+
 def load_latest_json(data_dir="data"):
     files = sorted(glob.glob(os.path.join(data_dir, "latest_cars.json")), reverse=True)
     if not files:
         raise FileNotFoundError("No bilbasen_cars_*.json files found in data directory.")
     return files[0]
 
-def extract_stats(listings):
-    stats = defaultdict(lambda: defaultdict(list))
-    model_images = defaultdict(lambda: defaultdict(str))
-    for car in listings:
-        make = car.get("make", "Unknown")
-        model = car.get("model", "Unknown")
-        price = car.get("price", {}).get("price", None)
-        reg_date = car.get("properties", {}).get("firstregistrationdate", {}).get("displayTextShort", "")
-        year = None
-        if reg_date:
-            year = int(reg_date.split("/")[-1]) if "/" in reg_date else int(reg_date)
-        battery = car.get("properties", {}).get("batterycapacity", {}).get("displayTextShort", "")
-        battery_kwh = None
-        if battery:
-            try:
-                battery_kwh = float(battery.split()[0].replace(",", "."))
-            except Exception:
-                battery_kwh = None
-        mileage = car.get("properties", {}).get("mileage", {}).get("displayTextShort", "")
-        mileage_km = None
-        if mileage:
-            try:
-                mileage_km = int(mileage.replace(" km", "").replace(".", ""))
-            except Exception:
-                mileage_km = None
-        electric_range = car.get("properties", {}).get("electricmotorrange", {}).get("displayTextShort", "")
-        range_km = None
-        if electric_range:
-            try:
-                range_km = int(electric_range.replace(" km", "").replace(".", ""))
-            except Exception:
-                range_km = None
-        # Find first image for the model if not already set
-        if not model_images[make][model]:
-            media = car.get("media", [])
-            for m in media:
-                if m.get("mediaType") == "Picture":
-                    model_images[make][model] = m.get("url")
-                    break
-        stats[make][model].append({
-            "price": price,
-            "year": year,
-            "battery_kwh": battery_kwh,
-            "mileage_km": mileage_km,
-            "range_km": range_km,
-            "uri": car.get("uri", "")
-        })
-    return stats, model_images
+def extract_stats(table):
+    """Per-make and per-model aggregates plus the listing links for each model"""
+    make_stats, model_stats = make_model_stats(table)
+    model_uris = defaultdict(list)
+    for make, model, uri in zip(table.make, table.model, table.uri):
+        model_uris[(make, model)].append(uri)
+    return make_stats, model_stats, model_uris, table.model_images()
+
+BRAND_TEMPLATE = Template("""<details class="brand" open><summary>{make} ({count} cars)</summary>
+<div class="model-grid">""")
+
+CARD_TEMPLATE = Template("""<div class="model-card" id="{model_id}" onclick="toggleModelDetails('{model_id}')">
+                <div class="model-title">{model}</div>
+                <div class="model-count">{count} cars</div>
+                <img src="{img_url}" alt="{model}" />
+                <div class="model-preview" style="font-size:0.97em; color:#444; margin:0.3em 0 0.2em 0;">
+                    <div>Min price: {price_min} kr</div>
+                    <div>Median price: {price_median} kr</div>
+                    <div>Max year: {year_max}</div>
+                    <div>Max battery: {battery_max} kWh</div>
+                </div>
+                <div class="model-details">
+            
+<table class="stat-table">
+<tr><th>Attribute</th><th>Min</th><th>P25</th><th>Median</th><th>P75</th><th>Max</th><th>Count</th></tr>""")
 
-def compute_ranges(values):
-    values = [v for v in values if v is not None]
-    if not values:
-        return (None, None)
-    return (min(values), max(values))
+STAT_ROW_TEMPLATE = Template("<tr><td>{label}</td><td>{min}</td><td>{p25}</td><td>{median}</td><td>{p75}</td><td>{max}</td><td>{count}</td></tr>")
+STAT_NA_TEMPLATE = Template("<tr><td>{label}</td><td colspan=6>N/A</td></tr>")
+LINK_TEMPLATE = Template('<li><a href="{uri}" target="_blank">Listing</a></li>')
 
-def html_escape(text):
-    return (str(text)
-            .replace("&", "&amp;")
-            .replace("<", "&lt;")
-            .replace(">", "&gt;")
-            .replace('"', "&quot;")
-            .replace("'", "&#39;"))
+def stat_row(label, summary, spec=""):
+    if not summary["count"]:
+        return STAT_NA_TEMPLATE.render(label=label)
+    values = {name: format(summary[name], spec) for name in ("min", "p25", "median", "p75", "max")}
+    return STAT_ROW_TEMPLATE.render(label=label, count=summary["count"], **values)
 
-def generate_html(stats, model_images, output_file):
+def generate_html(make_stats, model_stats, model_uris, model_images, output_file):
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    html = [f"""
+    head = f"""
     <html>
     <head>
         <meta charset='utf-8'>
@@ -110,64 +86,50 @@ def generate_html(stats, model_images, output_file):
     <body>
         <h1>Bilbasen Car Statistics</h1>
         <p>Generated: {now}</p>
-    """]
-    for make in sorted(stats.keys()):
-        html.append(f'<details class="brand" open><summary>{html_escape(make)} ({sum(len(stats[make][m]) for m in stats[make])} cars)</summary>')
-        html.append('<div class="model-grid">')
-        for idx, model in enumerate(sorted(stats[make].keys())):
-            cars = stats[make][model]
-            img_url = model_images[make][model]
-            model_id = f"{make}_{model}".replace(" ", "_").replace("/", "_")
-            prices = [c["price"] for c in cars]
-            years = [c["year"] for c in cars]
-            batteries = [c["battery_kwh"] for c in cars]
-            price_min, price_max = compute_ranges(prices)
-            year_min, year_max = compute_ranges(years)
-            battery_min, battery_max = compute_ranges(batteries)
-            html.append(f'''<div class="model-card" id="{model_id}" onclick="toggleModelDetails('{model_id}')">
-                <div class="model-title">{html_escape(model)}</div>
-                <div class="model-count">{len(cars)} cars</div>
-                <img src="{html_escape(img_url)}" alt="{html_escape(model)}" />
-                <div class="model-preview" style="font-size:0.97em; color:#444; margin:0.3em 0 0.2em 0;">
-                    <div>Min price: {price_min:,} kr</div>
-                    <div>Max year: {year_max if year_max is not None else 'N/A'}</div>
-                    <div>Max battery: {battery_max if battery_max is not None else 'N/A'} kWh</div>
-                </div>
-                <div class="model-details">
-            ''')
-            mileages = [c["mileage_km"] for c in cars]
-            ranges = [c["range_km"] for c in cars]
-            mileage_min, mileage_max = compute_ranges(mileages)
-            range_min, range_max = compute_ranges(ranges)
-            html.append('<table class="stat-table">')
-            html.append('<tr><th>Attribute</th><th>Min</th><th>Max</th></tr>')
-            html.append(f'<tr><td>Price (kr)</td><td>{price_min:,} </td><td>{price_max:,} </td></tr>' if price_min is not None else '<tr><td>Price (kr)</td><td colspan=2>N/A</td></tr>')
-            html.append(f'<tr><td>Year</td><td>{year_min}</td><td>{year_max}</td></tr>' if year_min is not None else '<tr><td>Year</td><td colspan=2>N/A</td></tr>')
-            html.append(f'<tr><td>Battery (kWh)</td><td>{battery_min}</td><td>{battery_max}</td></tr>' if battery_min is not None else '<tr><td>Battery (kWh)</td><td colspan=2>N/A</td></tr>')
-            html.append(f'<tr><td>Mileage (km)</td><td>{mileage_min:,}</td><td>{mileage_max:,}</td></tr>' if mileage_min is not None else '<tr><td>Mileage (km)</td><td colspan=2>N/A</td></tr>')
-            html.append(f'<tr><td>Range (km)</td><td>{range_min:,}</td><td>{range_max:,}</td></tr>' if range_min is not None else '<tr><td>Range (km)</td><td colspan=2>N/A</td></tr>')
-            html.append('</table>')
-            html.append('<ul>')
-            for c in cars:
-                html.append(f'<li><a href="{html_escape(c["uri"])}" target="_blank">Listing</a></li>')
-            html.append('</ul>')
-            html.append('</div></div>')
-        html.append('</div>')
-        html.append('</details>')
-    html.append("</body></html>")
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write("\n".join(html))
+    """
+    with HtmlStream(output_file) as out:
+        out.line(head)
+        models_by_make = defaultdict(list)
+        for make, model in model_stats:
+            models_by_make[make].append(model)
+        for make in sorted(make_stats):
+            out.line(BRAND_TEMPLATE.render(make=make, count=make_stats[make]["count"]))
+            for model in sorted(models_by_make[make]):
+                agg = model_stats[(make, model)]
+                out.line(CARD_TEMPLATE.render(
+                    model_id=f"{make}_{model}".replace(" ", "_").replace("/", "_"),
+                    model=model,
+                    count=agg["count"],
+                    img_url=model_images[make][model],
+                    price_min=fmt_value(agg["price"]["min"], ","),
+                    price_median=fmt_value(agg["price"]["median"], ",.0f"),
+                    year_max=fmt_value(agg["year"]["max"]),
+                    battery_max=fmt_value(agg["battery_kwh"]["max"]),
+                ))
+                out.line(stat_row("Price (kr)", agg["price"], ",.0f"))
+                out.line(stat_row("Year", agg["year"], ".0f"))
+                out.line(stat_row("Battery (kWh)", agg["battery_kwh"], ".1f"))
+                out.line(stat_row("Mileage (km)", agg["mileage_km"], ",.0f"))
+                out.line(stat_row("Range (km)", agg["range_km"], ",.0f"))
+                out.line('</table>')
+                out.line('<ul>')
+                for uri in model_uris[(make, model)]:
+                    out.line(LINK_TEMPLATE.render(uri=uri))
+                out.line('</ul>')
+                out.line('</div></div>')
+            out.line('</div>')
+            out.line('</details>')
+        out.write("</body></html>")
     print(f"HTML statistics written to {output_file}")
 
+def build_report(table, output_file, listings=None):
+    """Render bilbasen_stats.html from a normalized CarTable"""
+    generate_html(*extract_stats(table), output_file)
+
 def main():
     json_file = load_latest_json()
     print(f"Loading data from {json_file}")
-    with open(json_file, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    listings = data.get("listings", [])
-    stats, model_images = extract_stats(listings)
-    output_file = "bilbasen_stats.html"
-    generate_html(stats, model_images, output_file)
+    build_report(load_car_table(json_file), "bilbasen_stats.html")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,78 +1,48 @@
 import json
 import os
 import glob
-from collections import defaultdict
 from datetime import datetime
 
+from columnar import load_car_table
+from html_render import HtmlStream
+
 def load_latest_json(data_dir="data"):
     files = sorted(glob.glob(os.path.join(data_dir, "latest_cars.json")), reverse=True)
     if not files:
         raise FileNotFoundError("No bilbasen_cars_*.json files found in data directory.")
     return files[0]
 
-def extract_stats(listings):
-    stats = []
-    model_images = defaultdict(lambda: defaultdict(str))
-    for car in listings:
-        make = car.get("make", "Unknown")
-        model = car.get("model", "Unknown")
-        price = car.get("price", {}).get("price", None)
-        reg_date = car.get("properties", {}).get("firstregistrationdate", {}).get("displayTextShort", "")
-        year = None
-        if reg_date:
-            year = int(reg_date.split("/")[-1]) if "/" in reg_date else int(reg_date)
-        battery = car.get("properties", {}).get("batterycapacity", {}).get("displayTextShort", "")
-        battery_kwh = None
-        if battery:
-            try:
-                battery_kwh = float(battery.split()[0].replace(",", "."))
-            except Exception:
-                battery_kwh = None
-        mileage = car.get("properties", {}).get("mileage", {}).get("displayTextShort", "")
-        mileage_km = None
-        if mileage:
-            try:
-                mileage_km = int(mileage.replace(" km", "").replace(".", ""))
-            except Exception:
-                mileage_km = None
-        electric_range = car.get("properties", {}).get("electricmotorrange", {}).get("displayTextShort", "")
-        range_km = None
-        if electric_range:
-            try:
-                range_km = int(electric_range.replace(" km", "").replace(".", ""))
-            except Exception:
-                range_km = None
-        # Find first image for the model if not already set
-        if not model_images[make][model]:
-            media = car.get("media", [])
-            for m in media:
-                if m.get("mediaType") == "Picture":
-                    model_images[make][model] = m.get("url")
-                    break
-        stats.append({
-            "make": make,
-            "model": model,
-            "price": price,
-            "year": year,
-            "battery_kwh": battery_kwh,
-            "mileage_km": mileage_km,
-            "range_km": range_km,
-            "uri": car.get("uri", ""),
-            "img_url": model_images[make][model]
-        })
+def extract_stats(table):
+    model_images = table.model_images()
+    stats = table.records()
+    for car in stats:
+        car["img_url"] = model_images[car["make"]][car["model"]]
     return stats
 
-def html_escape(text):
-    return (str(text)
-            .replace("&", "&amp;")
-            .replace("<", "&lt;")
-            .replace(">", "&gt;")
-            .replace('"', "&quot;")
-            .replace("'", "&#39;"))
+URI_PREFIX = "https://www.bilbasen.dk/brugt/bil/"
+NUMERIC_FIELDS = ["year", "price", "battery_kwh", "mileage_km", "range_km"]
+
+def build_payload(stats):
+    """Compact column-oriented payload: dictionary-encoded strings, raw numbers"""
+    dictionaries = {"make": {}, "model": {}, "img_url": {}}
+    columns = {name: [] for name in ["make", "model", "img_url", "uri"] + NUMERIC_FIELDS}
+    for car in stats:
+        for name, values in dictionaries.items():
+            columns[name].append(values.setdefault(car[name] or "", len(values)))
+        uri = car["uri"] or ""
+        columns["uri"].append(uri[len(URI_PREFIX):] if uri.startswith(URI_PREFIX) else uri)
+        for name in NUMERIC_FIELDS:
+            columns[name].append(car[name])
+    return {
+        "count": len(stats),
+        "uriPrefix": URI_PREFIX,
+        "dictionaries": {name: list(values) for name, values in dictionaries.items()},
+        "columns": columns,
+    }
 
-def generate_html(stats, output_file):
+def generate_html(stats, output_file, page_size=50):
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    html = [f"""
+    head = f"""
     <html>
     <head>
         <meta charset='utf-8'>
@@ -86,94 +56,132 @@ def generate_html(stats, output_file):
             tr:nth-child(even) {{ background: #f6f6f6; }}
             .photo-col img {{ max-width: 120px; max-height: 80px; border-radius: 4px; background: #fff; }}
             .toggle-btn {{ margin-bottom: 1em; }}
+            .hide-photo .photo-col {{ display: none; }}
+            .pager {{ margin: 1em 0; }}
+            .pager button {{ margin: 0 0.3em; }}
         </style>
-        <script>
-        // Sort table by column
-        function sortTable(n) {{
-            var table = document.getElementById("carTable");
-            var rows = Array.from(table.rows).slice(1);
-            var asc = table.getAttribute('data-sort-col') != n || table.getAttribute('data-sort-dir') == 'desc';
-            rows.sort(function(a, b) {{
-                var x = a.cells[n].innerText || a.cells[n].textContent;
-                var y = b.cells[n].innerText || b.cells[n].textContent;
-                var xNum = parseFloat(x.replace(/[^0-9.-]+/g, ''));
-                var yNum = parseFloat(y.replace(/[^0-9.-]+/g, ''));
-                if (!isNaN(xNum) && !isNaN(yNum)) {{
-                    return asc ? xNum - yNum : yNum - xNum;
-                }}
-                return asc ? x.localeCompare(y) : y.localeCompare(x);
-            }});
-            for (var i = 0; i < rows.length; i++) table.tBodies[0].appendChild(rows[i]);
-            table.setAttribute('data-sort-col', n);
-            table.setAttribute('data-sort-dir', asc ? 'asc' : 'desc');
-        }}
-        // Toggle photo column
-        function togglePhoto() {{
-            var show = document.getElementById('photoToggle').checked;
-            var table = document.getElementById('carTable');
-            var idx = 0; // photo is first column
-            for (var r of table.rows) {{
-                if (r.cells.length > idx) r.cells[idx].style.display = show ? '' : 'none';
-            }}
-        }}
-        </script>
     </head>
     <body>
     <div class="container">
         <h1>Bilbasen Car Table Report</h1>
         <p>Generated: {now}</p>
         <label class="toggle-btn"><input type="checkbox" id="photoToggle" checked onchange="togglePhoto()"> Show Photo</label>
+        <div class="pager">
+            <button onclick="showPage(currentPage - 1)">&laquo; Prev</button>
+            <span id="pageInfo"></span>
+            <button onclick="showPage(currentPage + 1)">Next &raquo;</button>
+            <select id="pageSize" onchange="setPageSize(this.value)">
+                <option>25</option><option selected>{page_size}</option><option>100</option><option>250</option>
+            </select> per page
+        </div>
         <table id="carTable" data-sort-col="" data-sort-dir="">
             <thead>
                 <tr>
-                    <th onclick="sortTable(0)">Photo</th>
-                    <th onclick="sortTable(1)">Make</th>
-                    <th onclick="sortTable(2)">Model</th>
-                    <th onclick="sortTable(3)">Year</th>
-                    <th onclick="sortTable(4)">Price (kr)</th>
-                    <th onclick="sortTable(5)">Battery (kWh)</th>
-                    <th onclick="sortTable(6)">Mileage (km)</th>
-                    <th onclick="sortTable(7)">Range (km)</th>
+                    <th class="photo-col">Photo</th>
+                    <th onclick="sortTable('make')">Make</th>
+                    <th onclick="sortTable('model')">Model</th>
+                    <th onclick="sortTable('year')">Year</th>
+                    <th onclick="sortTable('price')">Price (kr)</th>
+                    <th onclick="sortTable('battery_kwh')">Battery (kWh)</th>
+                    <th onclick="sortTable('mileage_km')">Mileage (km)</th>
+                    <th onclick="sortTable('range_km')">Range (km)</th>
                     <th>Listing</th>
                 </tr>
             </thead>
-            <tbody>
-    """]
-    for car in stats:
-        html.append("<tr>")
-        # Photo
-        html.append(f'<td class="photo-col"><img src="{html_escape(car["img_url"])}" alt="{html_escape(car["model"])}" /></td>')
-        # Make, Model, Year, Price, Battery, Mileage, Range
-        html.append(f'<td>{html_escape(car["make"])}</td>')
-        html.append(f'<td>{html_escape(car["model"])}</td>')
-        html.append(f'<td>{car["year"] if car["year"] is not None else "N/A"}</td>')
-        html.append(f'<td>{car["price"]:,} </td>' if car["price"] is not None else '<td>N/A</td>')
-        html.append(f'<td>{car["battery_kwh"]}</td>' if car["battery_kwh"] is not None else '<td>N/A</td>')
-        html.append(f'<td>{car["mileage_km"]:,}</td>' if car["mileage_km"] is not None else '<td>N/A</td>')
-        html.append(f'<td>{car["range_km"]:,}</td>' if car["range_km"] is not None else '<td>N/A</td>')
-        html.append(f'<td><a href="{html_escape(car["uri"])}" target="_blank">Listing</a></td>')
-        html.append("</tr>")
-    html.append("""
-            </tbody>
+            <tbody></tbody>
         </table>
     </div>
-    <script>togglePhoto();</script>
+    <script type="application/json" id="carData">"""
+    script = f"""</script>
+    <script>
+    var DATA = JSON.parse(document.getElementById('carData').textContent);
+    var COLS = DATA.columns, DICTS = DATA.dictionaries;
+    var order = [];
+    for (var i = 0; i < DATA.count; i++) order.push(i);
+    var currentPage = 0, pageSize = {page_size};
+
+    function esc(s) {{
+        return String(s).replace(/[&<>"']/g, function(c) {{
+            return {{'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}}[c];
+        }});
+    }}
+    function num(v, sep) {{
+        if (v === null) return 'N/A';
+        return sep ? v.toLocaleString('en-US') : String(v);
+    }}
+    function renderRow(i) {{
+        var model = DICTS.model[COLS.model[i]];
+        var uri = COLS.uri[i];
+        if (uri.indexOf('http') !== 0) uri = DATA.uriPrefix + uri;
+        return '<tr><td class="photo-col"><img loading="lazy" src="' + esc(DICTS.img_url[COLS.img_url[i]]) + '" alt="' + esc(model) + '" /></td>' +
+            '<td>' + esc(DICTS.make[COLS.make[i]]) + '</td>' +
+            '<td>' + esc(model) + '</td>' +
+            '<td>' + num(COLS.year[i]) + '</td>' +
+            '<td>' + num(COLS.price[i], true) + '</td>' +
+            '<td>' + num(COLS.battery_kwh[i]) + '</td>' +
+            '<td>' + num(COLS.mileage_km[i], true) + '</td>' +
+            '<td>' + num(COLS.range_km[i], true) + '</td>' +
+            '<td><a href="' + esc(uri) + '" target="_blank">Listing</a></td></tr>';
+    }}
+    // Only the rows of the current page are ever in the DOM
+    function showPage(page) {{
+        var pages = Math.max(1, Math.ceil(order.length / pageSize));
+        currentPage = Math.min(Math.max(page, 0), pages - 1);
+        var start = currentPage * pageSize, end = Math.min(start + pageSize, order.length);
+        var html = [];
+        for (var k = start; k < end; k++) html.push(renderRow(order[k]));
+        document.querySelector('#carTable tbody').innerHTML = html.join('');
+        document.getElementById('pageInfo').textContent =
+            'Page ' + (currentPage + 1) + ' of ' + pages + ' (' + order.length + ' cars)';
+    }}
+    function setPageSize(size) {{
+        pageSize = parseInt(size, 10);
+        showPage(0);
+    }}
+    // Sort by column: numbers compare directly, text by its dictionary value
+    function sortTable(col) {{
+        var table = document.getElementById('carTable');
+        var asc = table.getAttribute('data-sort-col') != col || table.getAttribute('data-sort-dir') == 'desc';
+        var values = COLS[col], dict = DICTS[col];
+        var key = dict ? function(i) {{ return dict[values[i]]; }} : function(i) {{ return values[i]; }};
+        order.sort(function(a, b) {{
+            var x = key(a), y = key(b);
+            if (x === null) return y === null ? 0 : 1;
+            if (y === null) return -1;
+            var c = dict ? x.localeCompare(y) : x - y;
+            return asc ? c : -c;
+        }});
+        table.setAttribute('data-sort-col', col);
+        table.setAttribute('data-sort-dir', asc ? 'asc' : 'desc');
+        showPage(0);
+    }}
+    // Toggle photo column
+    function togglePhoto() {{
+        var show = document.getElementById('photoToggle').checked;
+        document.getElementById('carTable').classList.toggle('hide-photo', !show);
+    }}
+    togglePhoto();
+    showPage(0);
+    </script>
     </body>
     </html>
-    """)
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write("\n".join(html))
+    """
+    payload = json.dumps(build_payload(stats), ensure_ascii=False, separators=(",", ":"))
+    with HtmlStream(output_file) as out:
+        out.write(head)
+        # Keep the JSON from closing the script element early
+        out.write(payload.replace("</", "<\\/"))
+        out.write(script)
     print(f"HTML table report written to {output_file}")
 
+def build_report(table, output_file, listings=None):
+    """Render bilbasen_stats_table.html from a normalized CarTable"""
+    generate_html(extract_stats(table), output_file)
+
 def main():
     json_file = load_latest_json()
     print(f"Loading data from {json_file}")
-    with open(json_file, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    listings = data.get("listings", [])
-    stats = extract_stats(listings)
-    output_file = "bilbasen_stats_table.html"
-    generate_html(stats, output_file)
+    build_report(load_car_table(json_file), "bilbasen_stats_table.html")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,105 @@
+import argparse
+from datetime import datetime
+
+from html_render import HtmlStream, Template, fmt_value
+from snapshot_store import SnapshotStore
+
+ROW_TEMPLATE = Template(
+    "<tr><td>{make}</td><td>{model}</td><td>{sparkline!s}</td><td>{first}</td><td>{last}</td>"
+    "<td>{change}</td><td>{counts}</td></tr>")
+
+def sparkline(values, width=160, height=32):
+    """Inline SVG polyline of a series (None points are skipped)"""
+    points = [(i, v) for i, v in enumerate(values) if v is not None]
+    if len(points) < 2:
+        return ""
+    low = min(v for _, v in points)
+    high = max(v for _, v in points)
+    span = (high - low) or 1
+    step = width / max(len(values) - 1, 1)
+    coords = " ".join(f"{i * step:.1f},{height - 2 - (v - low) / span * (height - 4):.1f}" for i, v in points)
+    return (f'<svg width="{width}" height="{height}"><polyline fill="none" stroke="#2a6fdb" '
+            f'stroke-width="1.5" points="{coords}"/></svg>')
+
+def trend_rows(store, start=None, end=None):
+    """One row per make/model: median price per snapshot day, first/last median and supply"""
+    days = store.days(start, end)
+    rows = []
+    for (make, model), series in store.model_trends(start, end).items():
+        by_day = dict(series)
+        medians = [by_day[day]["median"] if day in by_day else None for day in days]
+        counts = [by_day[day]["count"] if day in by_day else 0 for day in days]
+        known = [m for m in medians if m is not None]
+        first = known[0] if known else None
+        last = known[-1] if known else None
+        change = (last - first) / first * 100 if first else None
+        rows.append({"make": make or "", "model": model or "", "medians": medians,
+                     "first": first, "last": last, "change": change,
+                     "counts": f"{counts[0]} → {counts[-1]}"})
+    rows.sort(key=lambda row: (row["make"], row["model"]))
+    return days, rows
+
+def generate_html(days, rows, output_file):
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    period = f"{days[0]} – {days[-1]}, {len(days)} snapshots" if days else "no snapshots"
+    head = f"""
+    <html>
+    <head>
+        <meta charset='utf-8'>
+        <title>Bilbasen Price Trends</title>
+        <style>
+            body {{ font-family: Arial, sans-serif; background: #f8f8f8; color: #222; }}
+            .container {{ margin: 2em auto; max-width: 1200px; background: #fff; padding: 2em; border-radius: 10px; box-shadow: 0 2px 8px #0002; }}
+            table {{ border-collapse: collapse; width: 100%; }}
+            th, td {{ border: 1px solid #ccc; padding: 0.5em 0.8em; text-align: left; }}
+            th {{ background: #e0e0e0; }}
+            tr:nth-child(even) {{ background: #f6f6f6; }}
+        </style>
+    </head>
+    <body>
+    <div class="container">
+        <h1>Bilbasen Price Trends</h1>
+        <p>Generated: {now} ({period})</p>
+        <table>
+            <thead>
+                <tr>
+                    <th>Make</th>
+                    <th>Model</th>
+                    <th>Median price</th>
+                    <th>First (kr)</th>
+                    <th>Last (kr)</th>
+                    <th>Change</th>
+                    <th>Listings</th>
+                </tr>
+            </thead>
+            <tbody>
+    """
+    with HtmlStream(output_file) as out:
+        out.line(head)
+        for row in rows:
+            out.line(ROW_TEMPLATE.render(
+                make=row["make"], model=row["model"], sparkline=sparkline(row["medians"]),
+                first=fmt_value(row["first"], ",.0f"), last=fmt_value(row["last"], ",.0f"),
+                change=fmt_value(row["change"], "+.1f") + ("%" if row["change"] is not None else ""),
+                counts=row["counts"]))
+        out.write("""
+            </tbody>
+        </table>
+    </div>
+    </body></html>""")
+    print(f"Trend report written to {output_file}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Price trend report from the snapshot store')
+    parser.add_argument('--dir', type=str, default='data/snapshots', help='Snapshot store directory')
+    parser.add_argument('--start', type=str, help='First day (YYYY-MM-DD)')
+    parser.add_argument('--end', type=str, help='Last day (YYYY-MM-DD)')
+    parser.add_argument('--output', type=str, default='bilbasen_trends.html', help='Output HTML file')
+    args = parser.parse_args()
+
+    with SnapshotStore(args.dir) as store:
+        days, rows = trend_rows(store, args.start, args.end)
+    generate_html(days, rows, args.output)
+
+if __name__ == "__main__":
+    main()
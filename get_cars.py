@@ -1,11 +1,48 @@
+import copy
 import requests
-import json
+import math
+import re
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
+import config
+from crawl_ledger import CrawlLedger
+from html_source import (HTML_PAGE_SIZE, NextDataScanner, as_api_response, client_filters,
+                         matches_client_filters, search_page_url, search_results)
+from metrics import Metrics
+from output_writer import ListingWriter
+from rate_control import AdaptiveRateLimiter, RateLimiter, RetryPolicy
+from serialization import decode_page, slim_listing
+from transport import create_session, request_timings, reset_timings, summarize_timings
+
 class BilbasenScraper:
-    def __init__(self):
+    def __init__(self, session=None, pool_size=10):
+        # One pooled keep-alive session per scraper; pass a shared session to
+        # reuse connections across several scrapers/searches in one process.
+        self.session = session or create_session(pool_size)
+        self.timings = []
+        # Optional RateLimiter shared with other scrapers (e.g. shards of one search)
+        self.rate_limiter = None
+        self.retry_policy = RetryPolicy()
+        self.retries = 0
+        # Stage timers and counters; shared with scrapers made by for_filters
+        self.metrics = Metrics()
+        # quiet drops the per-page log for a progress line every progress_interval seconds
+        self.quiet = False
+        self.progress_interval = 30
+        # slim keeps only the listing fields the reports use (serialization.SlimListing)
+        self.slim = False
+        # Optional response_cache.ResponseCache consulted before every request
+        self.cache = None
+        self._checkpoint = None
+        # "api" posts to the search API; "html" reads the search result pages.
+        # With html_fallback, pages the API fails to deliver are read from HTML.
+        self.source = "api"
+        self.html_fallback = False
+        # Search page URL copied from the browser, for filters html_source cannot map
+        self.search_page_url = None
         self.base_url = "https://www.bilbasen.dk/api/search/by-request"
         self.headers = {
             'Content-Type': 'application/json',
@@ -21,93 +58,329 @@ class BilbasenScraper:
             'Connection': 'keep-alive',
             'Sec-Fetch-Dest': 'empty'
         }
-
-        self.search_payload = {
-            "pageSize": 100,
-            "selectedFilters": {
-                "Ownership": {
-                    "value": {
-                        "value": "Retail"
-                    }
-                },
-                "Category": {
-                    "value": {
-                        "value": "Car"
-                    }
-                },
-                "PriceRange": {
-                    "value": {
-                        "fromValue": 100000,
-                        "toValue": 300000
-                    }
-                },
-                "FirstRegistration": {
-                    "value": {
-                        "fromValue": 2020
-                    }
-                },
-                # "FuelType": {
-                #     "values": [
-                #         {
-                #             "value": "Electric"
-                #         }
-                #     ]
-                # },
-                "InteriorComfortEquipments":{
-                    "values":[
-                        {
-                            "value":"HeadupDisplay"
-                        }
-                    ]
-                },
-                # "DriveWheel":{"values":[{"value":"Four"}]}
-                # "Make":{"values":[{"value":"Mercedes"}]},
-                # "Model":{
-                #     "values":[
-                #         {
-                #             "parent": {"key":"Make","value":"Mercedes"},
-                #             "values": ["ms-EQB-Klasse"]
-                #         }
-                #     ]
-                # }
-            }
+        self.html_headers = {
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.9',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'User-Agent': self.headers['User-Agent'],
+            'Connection': 'keep-alive'
         }
 
-    def fetch_page(self, page_number=1):
-        """Fetch a single page of results"""
+        self.search_payload = copy.deepcopy(config.SEARCH_FILTERS)
+        self.timeout = config.TIMEOUT
+        self.output_dir = Path(config.OUTPUT_DIR)
+
+    def fetch_page(self, page_number=1, page_size=None, revalidate=False):
+        """Fetch a single page of results.
+
+        With revalidate=True a fresh cache entry is not served as is, only
+        used for a conditional request.
+        """
+        if self.source == "html":
+            return self.fetch_html_page(page_number, page_size)
         payload = self.search_payload.copy()
         payload["page"] = page_number
+        if page_size is not None:
+            payload["pageSize"] = page_size
+
+        headers = self.headers
+        cache_key = cached = None
+        if self.cache is not None:
+            # Slim and full bodies of the same page are cached apart
+            cache_url = self.base_url + "#slim" if self.slim else self.base_url
+            cache_key, cached = self.cache.lookup(cache_url, payload)
+            if cached is not None and not revalidate and self.cache.is_fresh(cached):
+                if self.cache.touch(cached):
+                    return cached.body
+                # Evicted since the lookup: fetch it like any other miss
+                cached = None
+            if cached is not None:
+                headers = {**self.headers, **cached.conditional_headers()}
+
+        response = self._request(page_number, "POST", self.base_url, headers=headers, json=payload)
+        data = None
+        if response is not None:
+            try:
+                if response.status_code == 304 and cached is not None:
+                    self.cache.touch(cached, revalidated=True)
+                    return cached.body
+                response.raise_for_status()
+                with self.metrics.timer("decode"):
+                    data = decode_page(response.content, self.slim)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"Error fetching page {page_number}: {e}")
+        if data is None:
+            if self.html_fallback:
+                print(f"Falling back to the search page for page {page_number}")
+                return self.fetch_html_page(page_number, payload["pageSize"])
+            return None
+        if self.cache is not None:
+            self.cache.store(cache_key, data, response.headers)
+        return data
+
+    def _request(self, page_number, method, url, **kwargs):
+        """Send one request, retrying throttling, server errors and timeouts.
+
+        Returns the response, or None once the request failed for good.
+        """
+        limiter = self.rate_limiter
+        policy = self.retry_policy
+        metrics = self.metrics
+        error = None
+        for attempt in range(policy.max_retries + 1):
+            if attempt:
+                self.retries += 1
+                metrics.count("retries")
+                print(f"Retrying page {page_number} in {retry_delay:.1f}s ({error})")
+                time.sleep(retry_delay)
+            if limiter is not None:
+                limiter.wait()
+            try:
+                reset_timings()
+                metrics.count("requests")
+                with metrics.timer("fetch"):
+                    response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+                retry_delay = policy.delay_for(attempt)
+                if limiter is not None:
+                    limiter.record_failure()
+                continue
+            except requests.exceptions.RequestException as e:
+                print(f"Error fetching page {page_number}: {e}")
+                metrics.count("failures")
+                return None
+
+            timing = request_timings(response)
+            timing["page"] = page_number
+            self.timings.append(timing)
+            if policy.should_retry_status(response.status_code):
+                error = f"HTTP {response.status_code}"
+                retry_delay = policy.delay_for(attempt, response)
+                response.close()
+                if limiter is not None:
+                    limiter.record_failure()
+                    if response.status_code == 429:
+                        limiter.pause(retry_delay)
+                continue
+            if limiter is not None:
+                limiter.record_success(timing["elapsed"])
+            if not kwargs.get("stream"):
+                metrics.count("bytes", len(response.content))
+            return response
+
+        print(f"Error fetching page {page_number}: {error} (gave up after {policy.max_retries} retries)")
+        metrics.count("failures")
+        return None
+
+    def fetch_html_page(self, page_number=1, page_size=None):
+        """Fetch a page of results from the HTML search pages, in the API response shape.
+
+        Search pages hold HTML_PAGE_SIZE listings, so a larger page_size is
+        assembled from the search pages covering it.
+
+        Filters the search page cannot express (html_source.client_filters)
+        are applied to the listings here. The pages then come from a broader
+        search, so their numItems says nothing about this one and is left
+        out: the crawl goes on until the broader results run out.
+        """
+        page_size = page_size or self.search_payload.get("pageSize") or HTML_PAGE_SIZE
+        first = (page_number - 1) * page_size
+        end = first + page_size
+        listings = []
+        hits = 0
+        for html_page in range(first // HTML_PAGE_SIZE + 1, (end - 1) // HTML_PAGE_SIZE + 2):
+            result = self._fetch_search_page(html_page)
+            if result is None:
+                return None
+            page_listings, hits = result
+            offset = (html_page - 1) * HTML_PAGE_SIZE
+            listings.extend(page_listings[max(first - offset, 0):end - offset])
+            if len(page_listings) < HTML_PAGE_SIZE:
+                break
+        filters = client_filters(self.search_payload, self.search_page_url)
+        filtered_out = 0
+        if filters:
+            matching = [listing for listing in listings if matches_client_filters(listing, filters)]
+            filtered_out = len(listings) - len(matching)
+            listings, hits = matching, None
+        if self.slim:
+            listings = [slim_listing(listing) for listing in listings]
+        return as_api_response(listings, hits, page_number, filtered_out)
 
+    def _fetch_search_page(self, html_page):
+        """(listings, hits) from one search result page, or None on failure"""
+        try:
+            url = search_page_url(self.search_payload, html_page, self.search_page_url)
+        except ValueError as e:
+            print(f"Error fetching search page {html_page}: {e}")
+            return None
+        response = self._request(html_page, "GET", url, headers=self.html_headers, stream=True)
+        if response is None:
+            return None
         try:
-            response = requests.post(
-                self.base_url,
-                headers=self.headers,
-                json=payload,
-                timeout=30
-            )
             response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching page {page_number}: {e}")
+            # Scan the page as it downloads and stop once the JSON script ends
+            scanner = NextDataScanner()
+            with self.metrics.timer("fetch"):
+                for chunk in response.iter_content(64 * 1024):
+                    self.metrics.count("bytes", len(chunk))
+                    if scanner.feed(chunk):
+                        break
+            with self.metrics.timer("decode"):
+                return search_results(scanner.close())
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Error fetching search page {html_page}: {e}")
             return None
+        finally:
+            response.close()
 
-    def save_partial_data(self, listings, filename="bilbasen_cars_partial.json"):
-        """Save the current scraped data to a partial JSON file after each batch/page"""
-        # This method is now disabled to avoid creating partial files
-        pass
+    def for_filters(self, selected_filters):
+        """A scraper for different filters sharing this one's session and rate limiter"""
+        scraper = BilbasenScraper(session=self.session)
+        scraper.base_url = self.base_url
+        scraper.headers = self.headers
+        scraper.html_headers = self.html_headers
+        scraper.source = self.source
+        scraper.html_fallback = self.html_fallback
+        scraper.timeout = self.timeout
+        scraper.output_dir = self.output_dir
+        scraper.rate_limiter = self.rate_limiter
+        scraper.retry_policy = self.retry_policy
+        scraper.cache = self.cache
+        scraper.metrics = self.metrics
+        scraper.quiet = self.quiet
+        scraper.progress_interval = self.progress_interval
+        scraper.slim = self.slim
+        scraper.search_payload = copy.deepcopy(self.search_payload)
+        scraper.search_payload["selectedFilters"] = copy.deepcopy(selected_filters)
+        return scraper
 
-    def scrape_all_pages(self, max_pages=None, delay=1):
-        """Scrape all pages of results, saving after each batch and printing progress info"""
-        all_listings = []
-        page = 1
-        total_items = None
-        unique_brands = set()
-        min_price = float('inf')
-        max_price = 0
+    def count_items(self):
+        """Total number of results for the current search (fetches a single listing)"""
+        data = self.fetch_page(1, page_size=1)
+        if not data or 'pulse' not in data:
+            return None
+        return data['pulse']['object']['numItems']
+
+    def save_partial_data(self, page, data):
+        """Checkpoint one fetched page so an interrupted crawl can resume"""
+        if self._checkpoint is not None:
+            with self.metrics.timer("checkpoint"):
+                self._checkpoint.save_page(page, data)
+
+    def _get_page(self, page):
+        """Page from the checkpoint if already fetched, otherwise from the API"""
+        if self._checkpoint is not None and self._checkpoint.has_page(page):
+            with self.metrics.timer("checkpoint"):
+                return self._checkpoint.load_page(page)
+        data = self.fetch_page(page)
+        if data:
+            self.save_partial_data(page, data)
+        return data
+
+    def _is_checkpointed(self, page):
+        return self._checkpoint is not None and self._checkpoint.has_page(page)
+
+    def sort_by_newest(self):
+        """Sort results by listing date, newest first (needed for incremental stop)"""
+        self.search_payload["sortBy"] = "date"
+        self.search_payload["sortOrder"] = "desc"
+
+    def is_sorted_by_newest(self):
+        return (self.search_payload.get("sortBy") == "date"
+                and self.search_payload.get("sortOrder") == "desc")
+
+    def scrape_all_pages(self, max_pages=None, delay=1, concurrency=1, index=None,
+                         writer=None, keep_listings=True, checkpoint=None, adaptive=False, listings=None):
+        """Scrape all pages of results, printing progress info.
+
+        With concurrency > 1, page 1 is fetched first to learn the total page
+        count, then the remaining pages go through a pool of `concurrency`
+        workers. `delay` then acts as a shared rate limit (minimum seconds
+        between request starts) instead of a sleep after every page. Pages
+        are always collected in page order.
+
+        If a ListingIndex is given, every page is recorded in it, and when the
+        search is sorted by newest the crawl stops at the first page holding
+        only known listings with unchanged prices.
+
+        If a ListingWriter is given, each page is written to it as it arrives;
+        pass keep_listings=False to not also hold the listings in memory.
+        Kept listings are appended to `listings` if given (anything with an
+        extend(), e.g. a compact.RawSpill that keeps them on disk), otherwise
+        to a new list.
+
+        If a CrawlCheckpoint is given, every fetched page is persisted to it
+        and pages it already holds are replayed instead of re-fetched, so an
+        interrupted crawl resumes where it stopped.
+
+        Listings are de-duplicated by id as pages arrive (see CrawlLedger).
+        If results shifted between pages and the crawl ends with fewer unique
+        listings than reported, the pages around the drift are fetched again.
+
+        With adaptive=True (and no shared rate limiter set), `delay` is only
+        the starting interval: an AdaptiveRateLimiter speeds up while
+        responses are fast and clean and backs off on throttling or errors.
+        """
+        self._progress = {
+            "listings": [] if listings is None else listings,
+            "ledger": CrawlLedger(),
+            "stopped_early": False,
+            "writer": writer,
+            "keep_listings": keep_listings,
+            "unique_brands": set(),
+            "min_price": float('inf'),
+            "max_price": 0,
+            "last_progress": time.perf_counter(),
+            "index": index,
+            "stop_when_unchanged": index is not None and self.is_sorted_by_newest(),
+            "seen_at": datetime.now().isoformat(),
+        }
+        self.timings = []
+        self._checkpoint = checkpoint
+        self.retries = 0
+        own_limiter = adaptive and self.rate_limiter is None
+        if own_limiter:
+            self.rate_limiter = AdaptiveRateLimiter(delay)
+            delay = 0
         print("Starting to scrape Bilbasen...")
+        if checkpoint is not None and checkpoint.completed_pages:
+            print(f"Resuming: {len(checkpoint.completed_pages)} pages already checkpointed")
+        if concurrency > 1:
+            total_items = self._scrape_concurrent(max_pages, delay, concurrency)
+        else:
+            total_items = self._scrape_sequential(max_pages, delay)
+        ledger = self._progress["ledger"]
+        if total_items is not None:
+            total_items = ledger.total_items or total_items
+            if not self._progress["stopped_early"]:
+                self._refetch_drift(delay)
+        if ledger.duplicates:
+            print(f"Dropped {ledger.duplicates} duplicate listings that moved between pages")
+        self.print_timing_summary()
+        if own_limiter:
+            print(f"Adaptive rate settled at {self.rate_limiter.rate:.2f} requests/s ({self.retries} retries)")
+            self.rate_limiter = None
+        self._checkpoint = None
+        return self._progress["listings"], total_items
+
+    def print_timing_summary(self):
+        """Print connection reuse and per-request connect/TLS/TTFB averages"""
+        summary = summarize_timings(self.timings)
+        if not summary:
+            return
+        print(f"Requests: {summary['requests']} "
+              f"({summary['new_connections']} new connections, {summary['reused_connections']} reused)")
+        print(f"Avg connect: {summary['avg_connect_ms']:.1f} ms, "
+              f"avg TLS: {summary['avg_tls_ms']:.1f} ms, "
+              f"avg TTFB: {summary['avg_ttfb_ms']:.1f} ms")
+
+    def _scrape_sequential(self, max_pages, delay, page=1, total_items=None):
         while True:
-            print(f"Fetching page {page}...")
-            data = self.fetch_page(page)
+            if not self.quiet:
+                print(f"Fetching page {page}...")
+            data = self._get_page(page)
             if not data:
                 print(f"Failed to fetch page {page}, stopping.")
                 break
@@ -115,75 +388,241 @@ class BilbasenScraper:
             if total_items is None and 'pulse' in data:
                 total_items = data['pulse']['object']['numItems']
                 print(f"Total items found: {total_items}")
-            # Add listings from this page
-            listings = data.get('listings', [])
-            if not listings:
-                print("No more listings found, stopping.")
+            if not self._add_page(page, data):
                 break
-            all_listings.extend(listings)
-            # Update unique brands and price range
-            for listing in listings:
-                make = listing.get('make', 'Unknown')
-                unique_brands.add(make)
-                price = listing.get('price', {}).get('price', 0)
-                if price > 0:
-                    min_price = min(min_price, price)
-                    max_price = max(max_price, price)
-            print(f"Collected {len(listings)} listings from page {page} (Total: {len(all_listings)})")
-            # Print first car name/title for pagination validation
-            first_car = listings[0] if listings else None
-            first_car_name = first_car.get('title') or first_car.get('make', 'Unknown') if first_car else 'N/A'
-            print(f"First car on this page: {first_car_name}")
-            # Print current price range and unique brands
-            price_from = min_price if min_price != float('inf') else 'N/A'
-            price_to = max_price if max_price != 0 else 'N/A'
-            print(f"Current price range: {price_from:,} - {price_to:,} kr")
-            print(f"Unique brands so far: {sorted(unique_brands)}")
-            # Save after each batch/page (disabled to avoid partial files)
-            # self.save_partial_data(all_listings)
             # Check if we've reached the maximum pages
             if max_pages and page >= max_pages:
                 print(f"Reached maximum pages limit ({max_pages})")
+                self._progress["stopped_early"] = True
                 break
             # Check if we've collected all available items
-            if total_items and len(all_listings) >= total_items:
+            total_items = self._progress["ledger"].total_items or total_items
+            if total_items and len(self._progress["ledger"]) >= total_items:
                 print("Collected all available listings")
                 break
             page += 1
             # Add delay between requests to be respectful
-            if delay > 0:
+            if delay > 0 and not self._is_checkpointed(page):
+                time.sleep(delay)
+        return total_items
+
+    def _scrape_concurrent(self, max_pages, delay, concurrency):
+        print("Fetching page 1...")
+        first = self._get_page(1)
+        if not first:
+            print("Failed to fetch page 1, stopping.")
+            return None
+        total_items = None
+        if 'pulse' in first:
+            total_items = first['pulse']['object']['numItems']
+            print(f"Total items found: {total_items}")
+        if not self._add_page(1, first):
+            return total_items
+        if not total_items:
+            # Without a total we cannot plan the remaining pages up front
+            print("Total item count unknown, continuing sequentially.")
+            if max_pages and max_pages <= 1:
+                return total_items
+            if delay > 0 and not self._is_checkpointed(2):
                 time.sleep(delay)
-        return all_listings, total_items
+            return self._scrape_sequential(max_pages, delay, page=2, total_items=total_items)
+
+        page_size = self.search_payload.get("pageSize") or len(first.get('listings', []))
+        last_page = math.ceil(total_items / page_size)
+        limited = bool(max_pages and last_page > max_pages)
+        if limited:
+            last_page = max_pages
+            self._progress["stopped_early"] = True
+        if last_page <= 1:
+            return total_items
+
+        # fetch_page already waits on a shared limiter if there is one
+        limiter = RateLimiter(delay) if self.rate_limiter is None else None
+
+        def fetch(page):
+            if limiter is not None and not self._is_checkpointed(page):
+                limiter.wait()
+            return self._get_page(page)
+
+        print(f"Fetching pages 2-{last_page} with {concurrency} workers...")
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = pool.map(fetch, range(2, last_page + 1))
+            for page, data in enumerate(results, start=2):
+                if not data:
+                    print(f"Failed to fetch page {page}, stopping.")
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    break
+                if not self._add_page(page, data):
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    break
+        ledger = self._progress["ledger"]
+        if not limited and not self._progress["stopped_early"] and ledger.total_items:
+            # Listings added during the crawl can spill past the planned last page
+            if math.ceil(ledger.total_items / page_size) > last_page and len(ledger) < ledger.total_items:
+                print(f"Total grew to {ledger.total_items} during the crawl, continuing past page {last_page}")
+                return self._scrape_sequential(max_pages, delay, page=last_page + 1, total_items=total_items)
+        if limited:
+            print(f"Reached maximum pages limit ({max_pages})")
+        elif len(self._progress["ledger"]) >= (self._progress["ledger"].total_items or total_items):
+            print("Collected all available listings")
+        return total_items
+
+    def _add_page(self, page, data, refetch=False):
+        """Accumulate one page of results; returns False when the page is empty"""
+        progress = self._progress
+        all_listings = data.get('listings', [])
+        if not all_listings and not data.get('clientFiltered'):
+            print("No more listings found, stopping.")
+            return False
+        metrics = self.metrics
+        ledger = progress["ledger"]
+        with metrics.timer("accumulate"):
+            listings = ledger.add_page(page, all_listings, data.get('pulse', {}).get('object', {}).get('numItems'),
+                                       refetch=refetch)
+            if progress["keep_listings"]:
+                progress["listings"].extend(listings)
+        repeated = len(all_listings) - len(listings)
+        metrics.count("pages")
+        metrics.count("listings", len(listings))
+        if not refetch:
+            metrics.count("duplicates", repeated)
+        if progress["writer"] is not None and listings:
+            with metrics.timer("save"):
+                progress["writer"].write(listings)
+        if self.quiet:
+            now = time.perf_counter()
+            if now - progress["last_progress"] >= self.progress_interval:
+                progress["last_progress"] = now
+                print(metrics.progress_line())
+        else:
+            self._log_page(page, all_listings, listings, len(ledger))
+        metrics.export_if_due()
+        if progress["index"] is not None:
+            with metrics.timer("index"):
+                changed = progress["index"].record(all_listings, progress["seen_at"])
+            if not self.quiet:
+                print(f"New or re-priced listings on this page: {changed}")
+            if changed == 0 and all_listings and progress["stop_when_unchanged"]:
+                print("Page holds only known, unchanged listings, stopping early.")
+                progress["stopped_early"] = True
+                return False
+        return True
+
+    def _log_page(self, page, all_listings, listings, total):
+        """Per-page progress log: counts, first car, running price range and new brands"""
+        progress = self._progress
+        new_brands = set()
+        for listing in listings:
+            make = listing.get('make', 'Unknown')
+            if make not in progress["unique_brands"]:
+                new_brands.add(make)
+            price = listing.get('price', {}).get('price', 0)
+            if price > 0:
+                progress["min_price"] = min(progress["min_price"], price)
+                progress["max_price"] = max(progress["max_price"], price)
+        progress["unique_brands"] |= new_brands
+        repeated = len(all_listings) - len(listings)
+        print(f"Collected {len(listings)} listings from page {page} (Total: {total})"
+              + (f", {repeated} already seen on other pages" if repeated else ""))
+        # Print first car name/title for pagination validation
+        if all_listings:
+            first_car = all_listings[0]
+            first_car_name = first_car.get('title') or first_car.get('make', 'Unknown')
+            print(f"First car on this page: {first_car_name}")
+        if progress["max_price"]:
+            print(f"Current price range: {progress['min_price']:,} - {progress['max_price']:,} kr")
+        # Only the brands this page added, not the whole set re-sorted every page
+        if new_brands:
+            print(f"New brands: {', '.join(sorted(new_brands))} ({len(progress['unique_brands'])} so far)")
+
+    def _refetch_drift(self, delay):
+        """Fetch the pages around observed drift again, then a few further back while listings are missing.
+
+        Refetches are paced like the crawl: fetch_page waits on a shared rate
+        limiter if there is one, otherwise `delay` is slept before each.
+        """
+        ledger = self._progress["ledger"]
+        if not ledger.drift_pages:
+            return
+        while True:
+            pages = ledger.refetch_pages()
+            if not pages:
+                break
+            found = len(ledger)
+            print(f"Results shifted during the crawl ({len(ledger)} unique listings, {ledger.total_items} "
+                  f"reported), re-fetching pages {', '.join(map(str, pages))}")
+            for page in pages:
+                if delay > 0 and self.rate_limiter is None:
+                    time.sleep(delay)
+                # Past the checkpoint and any fresh cache entry: those hold the shifted page
+                data = self.fetch_page(page, revalidate=True)
+                if data:
+                    self.save_partial_data(page, data)
+                    self._add_page(page, data, refetch=True)
+            # Keep stepping back while listings are missing or the last pages still turned up new ones
+            if not ledger.missing() and len(ledger) == found:
+                break
+        if ledger.missing():
+            print(f"Still missing {ledger.missing()} of {ledger.total_items} listings after re-fetching")
+
+    def describe_filters(self):
+        """Human-readable summary of the search filters for the output envelope"""
+        summary = {}
+        for name, selected in self.search_payload.get("selectedFilters", {}).items():
+            key = re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower()
+            value = selected.get("value", {})
+            if name == "PriceRange":
+                low, high = value.get("fromValue"), value.get("toValue")
+                if low is not None and high is not None:
+                    summary[key] = f"{low:,} - {high:,} kr"
+                elif low is not None:
+                    summary[key] = f"{low:,}+ kr"
+                elif high is not None:
+                    summary[key] = f"up to {high:,} kr"
+            elif name == "FirstRegistration":
+                low, high = value.get("fromValue"), value.get("toValue")
+                summary[key] = f"{low or ''}-{high}" if high is not None else f"{low}+"
+            elif "values" in selected:
+                parts = []
+                for item in selected["values"]:
+                    if "parent" in item:
+                        parts.extend(f"{item['parent']['value']} {model}" for model in item.get("values", []))
+                    else:
+                        parts.append(str(item.get("value")))
+                summary[key] = ", ".join(parts)
+            elif "value" in value:
+                summary[key] = value["value"]
+        return summary
 
-    def save_data(self, listings, filename=None):
-        """Save the scraped data to a JSON file"""
+    def open_writer(self, filename=None, fmt="json", indent=2, columnar=True, filters=None):
+        """Open a streaming ListingWriter in the output directory.
+
+        With columnar=True a compact .columns file of the normalized fields is
+        written next to the JSON output. `filters` replaces the summary of
+        this scraper's search filters in the output envelope.
+        """
         if filename is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"bilbasen_cars_{timestamp}.json"
-
-        # Create data directory if it doesn't exist
-        data_dir = Path("data")
-        data_dir.mkdir(exist_ok=True)
-
-        filepath = data_dir / filename
-
-        # Prepare data structure
-        output_data = {
-            "scraped_at": datetime.now().isoformat(),
-            "total_listings": len(listings),
-            "filters": {
-                "price_range": "250,000 - 300,000 kr",
-                "fuel_type": "Electric",
-                "first_registration": "2024+",
-                "ownership": "Retail",
-                "category": "Car"
-            },
-            "listings": listings
-        }
+            extension = "ndjson" if fmt == "ndjson" else "json"
+            filename = f"bilbasen_cars_{timestamp}.{extension}"
+
+        # Create the output directory (and any subdirectory in filename) if needed
+        filepath = self.output_dir / filename
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+
+        if filters is None:
+            filters = self.describe_filters()
+        return ListingWriter(filepath, filters, fmt=fmt, indent=indent, columnar=columnar)
 
-        # Save to JSON file
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, indent=2, ensure_ascii=False)
+    def save_data(self, listings, filename=None, fmt="json", indent=2, columnar=True, filters=None):
+        """Save the scraped data to a JSON (or NDJSON) file, plus a .columns file"""
+        with self.metrics.timer("save"):
+            with self.open_writer(filename, fmt=fmt, indent=indent, columnar=columnar,
+                                  filters=filters) as writer:
+                # Write in page-sized chunks so no second full copy is built
+                for start in range(0, len(listings), 100):
+                    writer.write(listings[start:start + 100])
+        filepath = writer.filepath
 
         print(f"Data saved to: {filepath}")
         return filepath
@@ -225,8 +664,9 @@ class BilbasenScraper:
 def main():
     scraper = BilbasenScraper()
 
-    # Scrape all pages (with a 1-second delay between requests)
-    listings, total_items = scraper.scrape_all_pages(delay=1)
+    # Same politeness settings as run_scraper.py
+    listings, total_items = scraper.scrape_all_pages(max_pages=config.MAX_PAGES, delay=config.DELAY_BETWEEN_REQUESTS,
+                                                     concurrency=config.CONCURRENCY)
 
     if listings:
         # Save the data
@@ -0,0 +1,111 @@
+"""
+Small rendering helpers shared by the HTML report generators.
+
+- html_escape() escapes through a single str.translate table.
+- Template parses a str.format-style template once; render() only joins
+  the precomputed literal parts with the (escaped) field values.
+- HtmlStream buffers output and writes it to disk in fixed-size chunks, so
+  a report never has to exist in memory as one big string.
+"""
+
+from pathlib import Path
+from string import Formatter
+
+from atomic_write import AtomicFile
+
+_ESCAPE_TABLE = str.maketrans({
+    "&": "&amp;",
+    "<": "&lt;",
+    ">": "&gt;",
+    '"': "&quot;",
+    "'": "&#39;",
+})
+
+
+def html_escape(text):
+    return str(text).translate(_ESCAPE_TABLE)
+
+
+def fmt_value(value, spec="", missing="N/A"):
+    """format(value, spec), or `missing` for None"""
+    if value is None:
+        return missing
+    return format(value, spec)
+
+
+class Template:
+    """Compiled template with {field} / {field:spec} placeholders.
+
+    Field values are HTML-escaped after formatting, except for fields written
+    as {field!s}, which are inserted as-is (for values that are already markup).
+    """
+
+    def __init__(self, source):
+        self.parts = []
+        for literal, field, spec, conversion in Formatter().parse(source):
+            if literal:
+                self.parts.append(literal)
+            if field is not None:
+                self.parts.append((field, spec or "", conversion != "s"))
+
+    def render(self, **values):
+        out = []
+        append = out.append
+        for part in self.parts:
+            if part.__class__ is str:
+                append(part)
+                continue
+            name, spec, escape = part
+            value = values[name]
+            text = format(value, spec) if spec else str(value)
+            append(text.translate(_ESCAPE_TABLE) if escape else text)
+        return "".join(out)
+
+
+class HtmlStream:
+    """Buffered, chunked writer for a report file (written atomically on close)"""
+
+    def __init__(self, output_file, chunk_size=1 << 16):
+        self.output_file = Path(output_file)
+        self.chunk_size = chunk_size
+        self._file = AtomicFile(self.output_file)
+        self._buffer = []
+        self._buffered = 0
+
+    def write(self, text):
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.chunk_size:
+            self.flush()
+
+    def line(self, text):
+        self.write(text)
+        self.write("\n")
+
+    def flush(self):
+        if self._buffer:
+            self._file.write("".join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+
+    def close(self):
+        if self._file is None:
+            return
+        self.flush()
+        self._file.close()
+        self._file = None
+
+    def abort(self):
+        if self._file is None:
+            return
+        self._file.abort()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
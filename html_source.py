@@ -0,0 +1,222 @@
+"""
+Listing ingestion from Bilbasen search result pages (HTML).
+
+The public search page /brugt/bil?... embeds its results as JSON in a
+<script id="__NEXT_DATA__"> tag. Instead of parsing the HTML, the scan just
+looks for that tag's byte markers and hands the script body to the JSON parser:
+
+- NextDataScanner is fed the page chunk by chunk while it downloads, and only
+  buffers bytes once the tag has been found, so the response can be closed as
+  soon as the script ends.
+- read_next_data() mmaps a saved page and slices the script out without
+  decoding the rest of the file, for bulk ingestion of page archives.
+
+The listings inside have the same shape as the /api/search/by-request
+response, and as_api_response() wraps them in that response's envelope so the
+rest of the scraper does not need to know where a page came from.
+
+Not every API filter has a search page parameter. Those in CLIENT_FILTERS
+are left out of the URL and applied to the listings instead
+(matches_client_filters), so the default search still works from HTML; any
+other unmapped filter needs the search page URL copied from the browser.
+"""
+
+import mmap
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import serialization
+from listing_index import listing_id
+
+SEARCH_PAGE_URL = "https://www.bilbasen.dk/brugt/bil"
+# Results per search page; the HTML page size cannot be changed
+HTML_PAGE_SIZE = 30
+
+NEXT_DATA_MARKER = b'id="__NEXT_DATA__"'
+SCRIPT_END = b"</script>"
+
+# FuelType filter value -> fuel= query parameter of the search page
+FUEL_CODES = {"Electric": 3}
+
+# Equipment filter value -> phrases (lower case) in a listing's description that show it
+EQUIPMENT_TERMS = {
+    "HeadupDisplay": ("head-up", "headup", "head up"),
+}
+
+
+def _has_equipment(listing, selected):
+    text = (listing.get("description") or "").lower()
+    return all(any(term in text for term in EQUIPMENT_TERMS[item.get("value")])
+               for item in selected.get("values", []))
+
+
+def _equipment_known(selected):
+    return all(item.get("value") in EQUIPMENT_TERMS for item in selected.get("values", []))
+
+
+# Filters without a search page parameter that can be checked on the listings:
+# name -> (whether this selection can be checked, listing predicate)
+CLIENT_FILTERS = {
+    "InteriorComfortEquipments": (_equipment_known, _has_equipment),
+}
+
+
+class NextDataScanner:
+    """Incrementally locate and decode the __NEXT_DATA__ JSON in an HTML stream"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._in_script = False
+        self._scanned = 0
+        self.data = None
+
+    def feed(self, chunk):
+        """Add a chunk of the page; returns True once the JSON has been decoded"""
+        if self.data is not None:
+            return True
+        self._buffer += chunk
+        if not self._in_script:
+            pos = self._buffer.find(NEXT_DATA_MARKER)
+            if pos < 0:
+                # Keep just enough to catch a marker split across chunks
+                del self._buffer[:-len(NEXT_DATA_MARKER)]
+                return False
+            tag_end = self._buffer.find(b">", pos)
+            if tag_end < 0:
+                del self._buffer[:pos]
+                return False
+            del self._buffer[:tag_end + 1]
+            self._in_script = True
+        end = self._buffer.find(SCRIPT_END, self._scanned)
+        if end < 0:
+            self._scanned = max(len(self._buffer) - len(SCRIPT_END) + 1, 0)
+            return False
+        self.data = serialization.loads(self._buffer[:end])
+        self._buffer = bytearray()
+        return True
+
+    def close(self):
+        """Decoded JSON; raises ValueError if the page had no complete __NEXT_DATA__"""
+        if self.data is None:
+            raise ValueError("No __NEXT_DATA__ script found in page")
+        return self.data
+
+
+def find_next_data(buffer):
+    """Decode __NEXT_DATA__ from a complete page (bytes, bytearray or mmap)"""
+    pos = buffer.find(NEXT_DATA_MARKER)
+    tag_end = buffer.find(b">", pos) if pos >= 0 else -1
+    end = buffer.find(SCRIPT_END, tag_end) if tag_end >= 0 else -1
+    if end < 0:
+        raise ValueError("No __NEXT_DATA__ script found in page")
+    return serialization.loads(buffer[tag_end + 1:end])
+
+
+def read_next_data(path):
+    """Decode __NEXT_DATA__ from a saved page without reading the whole file into a string"""
+    with open(path, "rb") as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return find_next_data(mm)
+        except ValueError as e:
+            # Also raised by mmap for an empty file
+            raise ValueError(f"{path}: {e}") from None
+
+
+def search_results(next_data):
+    """(listings, hits) of the search query embedded in a page's __NEXT_DATA__"""
+    queries = next_data.get("props", {}).get("pageProps", {}).get("dehydratedState", {}).get("queries", [])
+    for query in queries:
+        data = query.get("state", {}).get("data")
+        if isinstance(data, dict) and "listings" in data:
+            listings = data["listings"]
+            return listings, data.get("hits", len(listings))
+    raise ValueError("No search results in __NEXT_DATA__")
+
+
+def as_api_response(listings, hits, page, filtered_out=0):
+    """Wrap page listings in the /api/search/by-request response envelope.
+
+    Without `hits` (unknown total) the envelope has no pulse. `filtered_out`
+    counts listings dropped by client filters, so a page left empty by them
+    is not taken for the end of the results.
+    """
+    response = {"listings": listings}
+    if hits is not None:
+        response["pulse"] = {"@type": "View", "object": {"numItems": hits, "pageNumber": page}}
+    if filtered_out:
+        response["clientFiltered"] = filtered_out
+    return response
+
+
+def search_page_url(search_payload, page=1, base_url=None):
+    """URL of one search result page for a search payload.
+
+    With `base_url` (a search page URL copied from the browser) only the page
+    parameter is replaced. Otherwise the URL is built from the payload's
+    filters. Filters in client_filters() are left out (the results are then
+    broader than the search); other filters without a known query parameter
+    raise ValueError.
+    """
+    if base_url is not None:
+        parts = urlsplit(base_url)
+        query = [(k, v) for k, v in parse_qsl(parts.query) if k != "page"]
+        if page > 1:
+            query.append(("page", page))
+        return urlunsplit(parts._replace(query=urlencode(query)))
+
+    query = {}
+    unsupported = []
+    for name, selected in search_payload.get("selectedFilters", {}).items():
+        value = selected.get("value", {})
+        if name == "PriceRange":
+            if "fromValue" in value:
+                query["pricefrom"] = value["fromValue"]
+            if "toValue" in value:
+                query["priceto"] = value["toValue"]
+        elif name == "FirstRegistration" and "fromValue" in value:
+            query["regfrom"] = f"{value['fromValue']}-01"
+        elif name == "Ownership" and value.get("value") == "Retail":
+            query["includeengroscvr"] = "true"
+            query["includeleasing"] = "false"
+        elif name == "Category" and value.get("value") == "Car":
+            pass  # /brugt/bil is the car category
+        elif name == "FuelType" and all(v.get("value") in FUEL_CODES for v in selected.get("values", [])):
+            query["fuel"] = ",".join(str(FUEL_CODES[v["value"]]) for v in selected["values"])
+        elif name in CLIENT_FILTERS and CLIENT_FILTERS[name][0](selected):
+            pass  # see client_filters()
+        else:
+            unsupported.append(name)
+    if unsupported:
+        raise ValueError(f"No search page parameter known for filter(s) {', '.join(unsupported)}; "
+                         "pass the search page URL from the browser instead")
+    if search_payload.get("sortBy"):
+        query["sortby"] = search_payload["sortBy"]
+        query["sortorder"] = search_payload.get("sortOrder", "asc")
+    if page > 1:
+        query["page"] = page
+    return f"{SEARCH_PAGE_URL}?{urlencode(sorted(query.items()))}"
+
+
+def client_filters(search_payload, base_url=None):
+    """{name: selection} of the payload's filters the search page URL leaves to the client"""
+    if base_url is not None:
+        return {}
+    return {name: selected for name, selected in search_payload.get("selectedFilters", {}).items()
+            if name in CLIENT_FILTERS and CLIENT_FILTERS[name][0](selected)}
+
+
+def matches_client_filters(listing, filters):
+    """Whether a listing passes every filter returned by client_filters()"""
+    return all(CLIENT_FILTERS[name][1](listing, selected) for name, selected in filters.items())
+
+
+def iter_saved_listings(paths):
+    """Yield listings from saved search pages, skipping repeats across pages"""
+    seen = set()
+    for path in paths:
+        listings, _ = search_results(read_next_data(path))
+        for listing in listings:
+            lid = listing_id(listing)
+            if lid not in seen:
+                seen.add(lid)
+                yield listing
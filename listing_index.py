@@ -0,0 +1,124 @@
+"""
+Persistent listing index for incremental scraping.
+
+Keeps one row per listing (keyed on externalId, falling back to uri) with
+first-seen / last-seen timestamps, the last known price and the raw listing,
+plus a price history table that gets a row whenever a price changes.
+"""
+
+import sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import serialization
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    id TEXT PRIMARY KEY,
+    uri TEXT,
+    make TEXT,
+    model TEXT,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    last_price INTEGER,
+    data TEXT
+);
+CREATE TABLE IF NOT EXISTS price_history (
+    id TEXT NOT NULL,
+    seen_at TEXT NOT NULL,
+    price INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_price_history_id ON price_history (id);
+CREATE INDEX IF NOT EXISTS idx_listings_last_seen ON listings (last_seen);
+"""
+
+
+def listing_id(listing):
+    """Stable identifier for a listing: externalId, or the uri if that is missing"""
+    external_id = listing.get("externalId")
+    if external_id is not None:
+        return str(external_id)
+    return listing.get("uri", "")
+
+
+class ListingIndex:
+    def __init__(self, path="data/listings.db"):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, listings, seen_at=None):
+        """Upsert a batch of listings; returns how many were new or changed price"""
+        if not listings:
+            return 0
+        seen_at = seen_at or datetime.now().isoformat()
+        by_id = {listing_id(listing): listing for listing in listings}
+        known = self._known_prices(list(by_id))
+
+        inserts = []
+        updates = []
+        history = []
+        for lid, listing in by_id.items():
+            price = listing.get("price", {}).get("price")
+            data = serialization.dumps(listing)
+            if lid not in known:
+                inserts.append((lid, listing.get("uri", ""), listing.get("make"), listing.get("model"),
+                                seen_at, seen_at, price, data))
+                history.append((lid, seen_at, price))
+            else:
+                updates.append((seen_at, price, data, lid))
+                if known[lid] != price:
+                    history.append((lid, seen_at, price))
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO listings (id, uri, make, model, first_seen, last_seen, last_price, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", inserts)
+            self.conn.executemany(
+                "UPDATE listings SET last_seen = ?, last_price = ?, data = ? WHERE id = ?", updates)
+            self.conn.executemany(
+                "INSERT INTO price_history (id, seen_at, price) VALUES (?, ?, ?)", history)
+        return len(history)
+
+    def _known_prices(self, ids):
+        known = {}
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT id, last_price FROM listings WHERE id IN ({placeholders})", chunk)
+            known.update(rows)
+        return known
+
+    def active_listings(self, max_age_days=7):
+        """Raw listings seen within the last `max_age_days`, newest first"""
+        since = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+        rows = self.conn.execute(
+            "SELECT data FROM listings WHERE last_seen >= ? ORDER BY first_seen DESC", (since,))
+        return [serialization.loads(data) for (data,) in rows]
+
+    def price_history(self, lid):
+        """List of (seen_at, price) for one listing, oldest first"""
+        rows = self.conn.execute(
+            "SELECT seen_at, price FROM price_history WHERE id = ? ORDER BY seen_at", (str(lid),))
+        return rows.fetchall()
+
+    def get(self, lid):
+        row = self.conn.execute(
+            "SELECT id, uri, make, model, first_seen, last_seen, last_price FROM listings WHERE id = ?",
+            (str(lid),)).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "uri", "make", "model", "first_seen", "last_seen", "last_price")
+        return dict(zip(keys, row))
@@ -0,0 +1,195 @@
+"""
+Crawl metrics and profiling hooks.
+
+Metrics collects what a crawl spends its time on. Stage timers
+(fetch, decode, accumulate, save, checkpoint, index) add up wall time per
+stage; fetch runs in worker threads, so with concurrency its total can exceed
+the elapsed time. Counters cover requests, bytes, retries, pages and
+listings. One lock guards the updates, so a Metrics can be shared by
+concurrent scrapers (shards, batch searches).
+
+Metrics are exported as JSON, or in the Prometheus text format for the
+node_exporter textfile collector (files ending in .prom). Both files are
+replaced atomically; with `export_path` set, the scraper rewrites the file
+every `export_interval` seconds during the crawl, so it can be watched live.
+
+profiled() wraps a run in cProfile and/or tracemalloc and prints the top
+entries when it ends.
+"""
+
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+from atomic_write import write_atomic
+
+STAGES = ("fetch", "decode", "accumulate", "save", "checkpoint", "index")
+COUNTERS = ("requests", "bytes", "retries", "failures", "pages", "listings", "duplicates")
+
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add_time(self.stage, time.perf_counter() - self.start)
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self.stage_calls = dict.fromkeys(STAGES, 0)
+        self.peak_memory = None
+        self.export_path = None
+        self.export_interval = 30
+        self._last_export = self._start
+        self._lock = threading.Lock()
+
+    def timer(self, stage):
+        """Context manager adding the time spent in the block to `stage`"""
+        return _Timer(self, stage)
+
+    def add_time(self, stage, seconds):
+        with self._lock:
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+            self.stage_calls[stage] = self.stage_calls.get(stage, 0) + 1
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+    def snapshot(self):
+        """All metrics as one JSON-ready dict"""
+        with self._lock:
+            counters = dict(self.counters)
+            stages = {stage: {"seconds": round(self.stage_seconds[stage], 4), "calls": self.stage_calls[stage]}
+                      for stage in self.stage_seconds}
+        elapsed = self.elapsed()
+        return {
+            "started_at": self.started,
+            "elapsed_seconds": round(elapsed, 3),
+            "counters": counters,
+            "rates": {
+                "listings_per_second": round(counters["listings"] / elapsed, 2) if elapsed else None,
+                "requests_per_second": round(counters["requests"] / elapsed, 2) if elapsed else None,
+                "bytes_per_second": round(counters["bytes"] / elapsed, 1) if elapsed else None,
+            },
+            "stages": stages,
+            "peak_memory_bytes": self.peak_memory,
+        }
+
+    def progress_line(self):
+        """One-line progress summary for periodic logging"""
+        snapshot = self.snapshot()
+        counters = snapshot["counters"]
+        return (f"[{snapshot['elapsed_seconds']:.0f}s] {counters['pages']} pages, "
+                f"{counters['listings']:,} listings ({snapshot['rates']['listings_per_second'] or 0:.1f}/s), "
+                f"{counters['requests']} requests, {counters['retries']} retries, "
+                f"{counters['bytes'] / 1e6:.1f} MB")
+
+    def summary(self):
+        """Multi-line per-stage breakdown for the end of a run"""
+        snapshot = self.snapshot()
+        lines = [self.progress_line()]
+        for stage, values in snapshot["stages"].items():
+            if values["calls"]:
+                lines.append(f"  {stage:<11} {values['seconds']:>9.3f}s  {values['calls']:>7} calls")
+        return "\n".join(lines)
+
+    def to_prometheus(self, prefix="bilbasen_scraper"):
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{prefix}_{name}{labels} {value}")
+
+        for name, value in snapshot["counters"].items():
+            metric(f"{name}_total", "counter", f"Crawl {name} so far", [("", value)])
+        metric("elapsed_seconds", "gauge", "Seconds since the crawl started",
+               [("", snapshot["elapsed_seconds"])])
+        metric("stage_seconds_total", "counter", "Wall time spent per stage",
+               [(f'{{stage="{stage}"}}', values["seconds"]) for stage, values in snapshot["stages"].items()])
+        metric("stage_calls_total", "counter", "Calls per stage",
+               [(f'{{stage="{stage}"}}', values["calls"]) for stage, values in snapshot["stages"].items()])
+        if snapshot["peak_memory_bytes"] is not None:
+            metric("peak_memory_bytes", "gauge", "Peak traced Python memory",
+                   [("", snapshot["peak_memory_bytes"])])
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """Write the metrics to `path`: Prometheus text format for .prom files, JSON otherwise"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.suffix == ".prom":
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.snapshot(), indent=2)
+        return write_atomic(path, text)
+
+    def export_if_due(self):
+        """Rewrite export_path if export_interval has passed since the last write"""
+        if self.export_path is None:
+            return
+        now = time.perf_counter()
+        if now - self._last_export >= self.export_interval:
+            self._last_export = now
+            self.export(self.export_path)
+
+
+@contextmanager
+def profiled(profile_path=None, trace_memory=False, metrics=None, top=20):
+    """Run the block under cProfile (saved to profile_path) and/or tracemalloc.
+
+    Prints the `top` functions by cumulative time and the `top` allocation
+    sites; the tracemalloc peak is stored on `metrics` if given. cProfile
+    only sees the calling thread, so with concurrency the fetch workers show
+    up as time spent waiting on the pool.
+    """
+    profiler = None
+    if trace_memory:
+        tracemalloc.start()
+    if profile_path:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            Path(profile_path).parent.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(profile_path)
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(top)
+            print(output.getvalue())
+            print(f"Profile saved to {profile_path} (open with python -m pstats or snakeviz)")
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            if metrics is not None:
+                metrics.peak_memory = peak
+            print(f"Peak traced memory: {peak / 1e6:.1f} MB. Top allocation sites still live:")
+            for stat in snapshot.statistics("lineno")[:top]:
+                print(f"  {stat}")
@@ -0,0 +1,153 @@
+"""
+Listing normalization shared by the report generators.
+
+Raw Bilbasen listings carry most specs as display strings ("74 kWh",
+"13.900 km", "11/2024", "229 hk"). normalize_listings() parses them once, in
+a single pass, into a CarTable: one list per column, with None for values
+that are missing or unparseable. The repeated strings (make, model, variant,
+gear, fuel) are interned, so every row of a model shares one string object.
+"""
+
+import sys
+from collections import defaultdict
+
+COLUMNS = (
+    "make", "model", "variant", "price", "year", "battery_kwh", "mileage_km",
+    "range_km", "power_hk", "doors", "gear", "fuel", "uri", "image_url",
+)
+
+NUMERIC_COLUMNS = ("price", "year", "battery_kwh", "mileage_km", "range_km", "power_hk", "doors")
+
+
+def parse_year(text):
+    """'11/2024' or '2024' -> 2024"""
+    if not text:
+        return None
+    try:
+        return int(text.rsplit("/", 1)[-1])
+    except ValueError:
+        return None
+
+
+def parse_kwh(text):
+    """'74 kWh' or '77,4 kWh' -> 74.0 / 77.4"""
+    if not text:
+        return None
+    try:
+        return float(text.split()[0].replace(",", "."))
+    except (ValueError, IndexError):
+        return None
+
+
+def parse_km(text):
+    """'13.900 km' -> 13900"""
+    if not text:
+        return None
+    try:
+        return int(text.replace(" km", "").replace(".", ""))
+    except ValueError:
+        return None
+
+
+def parse_hk(text):
+    """'229 hk' -> 229"""
+    if not text:
+        return None
+    try:
+        return int(text.split()[0])
+    except (ValueError, IndexError):
+        return None
+
+
+def interned(text):
+    return sys.intern(text) if isinstance(text, str) else text
+
+
+def first_picture(listing):
+    for m in listing.get("media", ()):
+        if m.get("mediaType") == "Picture":
+            return m.get("url")
+    return None
+
+
+class CarTable:
+    """Column-oriented table of normalized listings"""
+    __slots__ = COLUMNS + ("_cache",)
+
+    def __init__(self):
+        for name in COLUMNS:
+            setattr(self, name, [])
+        self._cache = {}
+
+    def cached(self, key, compute):
+        """Memoize derived data (aggregates etc.) until rows are appended"""
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def __len__(self):
+        return len(self.make)
+
+    def column(self, name):
+        return getattr(self, name)
+
+    def record(self, i):
+        """Row `i` as a dict"""
+        return {name: getattr(self, name)[i] for name in COLUMNS}
+
+    def records(self, indices=None):
+        columns = [(name, getattr(self, name)) for name in COLUMNS]
+        if indices is None:
+            indices = range(len(self))
+        return [{name: values[i] for name, values in columns} for i in indices]
+
+    def group_by(self, *names):
+        """Map of key -> list of row indices, keys in first-seen order"""
+        groups = defaultdict(list)
+        if len(names) == 1:
+            for i, key in enumerate(getattr(self, names[0])):
+                groups[key].append(i)
+        else:
+            for i, key in enumerate(zip(*(getattr(self, name) for name in names))):
+                groups[key].append(i)
+        return groups
+
+    def values(self, name, indices=None):
+        """Non-None values of a column, optionally restricted to some rows"""
+        column = getattr(self, name)
+        if indices is None:
+            return [v for v in column if v is not None]
+        return [v for v in (column[i] for i in indices) if v is not None]
+
+    def model_images(self):
+        """First picture URL per (make, model), as make -> model -> url"""
+        images = defaultdict(lambda: defaultdict(str))
+        for make, model, url in zip(self.make, self.model, self.image_url):
+            if url and not images[make][model]:
+                images[make][model] = url
+        return images
+
+
+def normalize_listings(listings, table=None):
+    """Parse raw listings into a CarTable in one pass (appending to `table` if given)"""
+    if table is None:
+        table = CarTable()
+    table._cache.clear()
+    append = {name: getattr(table, name).append for name in COLUMNS}
+    for car in listings:
+        props = car.get("properties") or {}
+        append["make"](interned(car.get("make", "Unknown")))
+        append["model"](interned(car.get("model", "Unknown")))
+        append["variant"](interned(car.get("variant", "")))
+        append["price"]((car.get("price") or {}).get("price"))
+        append["year"](parse_year(props.get("firstregistrationdate", {}).get("displayTextShort", "")))
+        append["battery_kwh"](parse_kwh(props.get("batterycapacity", {}).get("displayTextShort", "")))
+        append["mileage_km"](parse_km(props.get("mileage", {}).get("displayTextShort", "")))
+        append["range_km"](parse_km(props.get("electricmotorrange", {}).get("displayTextShort", "")))
+        append["power_hk"](parse_hk(props.get("hk", {}).get("displayTextShort", "")))
+        append["doors"](car.get("doors"))
+        append["gear"](interned(props.get("geartype", {}).get("displayTextShort", "")))
+        append["fuel"](interned(props.get("fueltype", {}).get("displayTextShort", "")))
+        append["uri"](car.get("uri", ""))
+        append["image_url"](first_picture(car))
+    return table
@@ -0,0 +1,115 @@
+"""
+Streaming writer for scraped listings.
+
+Listings are written page by page as they arrive instead of being collected
+into one big dict first. Two formats are supported:
+
+- "json":   the usual latest_cars.json envelope (scraped_at, filters,
+            listings, total_listings), with the listings array streamed and
+            total_listings written after it.
+- "ndjson": one listing per line; the envelope (including total_listings)
+            goes to a "<name>.meta.json" sidecar when the file is closed.
+
+Listings are encoded with serialization.dumps (orjson when installed). The
+file is written under a temporary name and moved into place on close, so
+readers never see a half-written file. With columnar=True the listings are
+also normalized as they are written, held in a CompactTable (typed arrays,
+see compact.py) and saved next to the output as a .columns file (see
+columnar.py).
+"""
+
+from datetime import datetime
+from pathlib import Path
+
+import serialization
+from atomic_write import AtomicFile, write_json_atomic
+from columnar import columnar_path, write_columnar
+from compact import CompactTable
+
+
+class ListingWriter:
+    def __init__(self, filepath, filters=None, fmt="json", indent=None, columnar=False):
+        if fmt not in ("json", "ndjson"):
+            raise ValueError(f"Unknown output format: {fmt}")
+        self.filepath = Path(filepath)
+        self.filters = filters or {}
+        self.fmt = fmt
+        self.indent = indent
+        self.count = 0
+        self.table = CompactTable() if columnar else None
+        self.scraped_at = datetime.now().isoformat()
+        self._file = AtomicFile(self.filepath)
+        if fmt == "json":
+            self._write_json_header()
+
+    def _dumps(self, obj, level=0):
+        text = serialization.dumps(obj, indent=self.indent)
+        if self.indent is not None and level:
+            text = text.replace("\n", "\n" + " " * (self.indent * level))
+        return text
+
+    def _write_json_header(self):
+        nl = "\n" if self.indent is not None else ""
+        pad = " " * (self.indent or 0)
+        sep = ": " if self.indent is not None else ":"
+        self._file.write("{" + nl)
+        self._file.write(f'{pad}"scraped_at"{sep}{self._dumps(self.scraped_at)},{nl}')
+        self._file.write(f'{pad}"filters"{sep}{self._dumps(self.filters, 1)},{nl}')
+        self._file.write(f'{pad}"listings"{sep}[')
+
+    def write(self, listings):
+        """Append a batch (typically one page) of listings"""
+        if self.table is not None:
+            self.table.extend(listings)
+        if self.fmt == "ndjson":
+            self._file.writelines(serialization.dumps(listing) + "\n" for listing in listings)
+            self.count += len(listings)
+            return
+        nl = "\n" if self.indent is not None else ""
+        pad = " " * (2 * (self.indent or 0))
+        chunks = []
+        for listing in listings:
+            prefix = "," if self.count else ""
+            chunks.append(f"{prefix}{nl}{pad}{self._dumps(listing, 2)}")
+            self.count += 1
+        self._file.write("".join(chunks))
+
+    def close(self):
+        """Finish the file, move it into place and return its path"""
+        if self._file is None:
+            return self.filepath
+        if self.fmt == "json":
+            nl = "\n" if self.indent is not None else ""
+            pad = " " * (self.indent or 0)
+            sep = ": " if self.indent is not None else ":"
+            closing = f"{nl}{pad}]" if self.count else "]"
+            self._file.write(f'{closing},{nl}{pad}"total_listings"{sep}{self.count}{nl}}}{nl}')
+        self._file.close()
+        self._file = None
+        if self.fmt == "ndjson":
+            meta = {
+                "scraped_at": self.scraped_at,
+                "total_listings": self.count,
+                "filters": self.filters,
+                "listings_file": self.filepath.name,
+            }
+            meta_path = self.filepath.with_name(self.filepath.name + ".meta.json")
+            write_json_atomic(meta_path, meta, indent=2)
+        if self.table is not None:
+            write_columnar(self.table, columnar_path(self.filepath))
+        return self.filepath
+
+    def abort(self):
+        """Discard a partially written file"""
+        if self._file is not None:
+            self._file.abort()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -0,0 +1,121 @@
+"""
+Request pacing and retry policy for the scraper.
+
+- RateLimiter spaces request starts a fixed interval apart across threads.
+- AdaptiveRateLimiter adjusts that interval AIMD-style: every fast, clean
+  response adds a little to the request rate, while throttling (429),
+  server errors, timeouts or slow responses cut the rate multiplicatively.
+  A Retry-After from the server pauses every worker.
+- RetryPolicy decides which failures are retried and computes jittered
+  exponential backoff delays.
+"""
+
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+
+class RateLimiter:
+    """Space request starts at least `interval` seconds apart, shared across worker threads"""
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        if self.interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def pause(self, seconds):
+        """Hold back every worker for `seconds` (e.g. after a Retry-After)"""
+        with self._lock:
+            self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+    # Fixed-rate limiter ignores feedback
+    def record_success(self, latency):
+        pass
+
+    def record_failure(self):
+        pass
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """RateLimiter whose interval follows observed latency and errors (AIMD)"""
+
+    def __init__(self, interval=1.0, min_interval=0.05, max_interval=30.0,
+                 increase=0.1, decrease=2.0, latency_target=2.0):
+        # A zero starting interval gives AIMD nothing to back off from
+        super().__init__(max(interval, min_interval))
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.increase = increase            # requests/second added per good response
+        self.decrease = decrease            # interval multiplier on trouble
+        self.latency_target = latency_target
+
+    def record_success(self, latency):
+        with self._lock:
+            if latency > self.latency_target:
+                # Slow answers are an early congestion signal; back off gently
+                self.interval = min(self.interval * 1.25, self.max_interval)
+            else:
+                rate = 1.0 / self.interval + self.increase
+                self.interval = max(1.0 / rate, self.min_interval)
+
+    def record_failure(self):
+        with self._lock:
+            self.interval = min(self.interval * self.decrease, self.max_interval)
+
+    @property
+    def rate(self):
+        return 1.0 / self.interval
+
+
+def retry_after_seconds(response):
+    """Seconds requested by a Retry-After header, or None"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RetryPolicy:
+    def __init__(self, max_retries=4, base_delay=1.0, max_delay=60.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry_status(self, status_code):
+        return status_code in RETRY_STATUSES
+
+    def backoff(self, attempt):
+        """Full-jitter exponential backoff for retry number `attempt` (0-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def delay_for(self, attempt, response=None):
+        """Backoff delay, raised to the server's Retry-After when it asks for more"""
+        delay = self.backoff(attempt)
+        if response is not None:
+            retry_after = retry_after_seconds(response)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+        return delay
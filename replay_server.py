@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Offline stand-in for the Bilbasen search API.
+
+Serves POST /api/search/by-request (and GET /brugt/bil search result pages
+with the results embedded as __NEXT_DATA__) from the listings captured in
+demo_data/response.html, optionally scaled up to any number of synthetic
+listings. Synthetic listings are clones of the captured ones with unique
+externalId/uri values and jittered prices; they are built on demand per page,
+so a 100k-listing server costs little more memory than the capture itself.
+
+The PriceRange filter, price/date sorting and page/pageSize paging behave
+like the live endpoint, which is enough for the scraper, sharding and the
+benchmarks to run against it. Point a scraper at it with
+scraper.base_url = server.url.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+CAPTURE_FILE = "demo_data/response.html"
+SEARCH_PATH = "/api/search/by-request"
+SEARCH_PAGE_PATH = "/brugt/bil"
+HTML_PAGE_SIZE = 30
+
+_NEXT_DATA = re.compile(r'<script id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.S)
+
+
+def load_capture(path=CAPTURE_FILE):
+    """(listings, hits) from the __NEXT_DATA__ blob of a captured search page"""
+    with open(path, "r", encoding="utf-8") as f:
+        match = _NEXT_DATA.search(f.read())
+    if match is None:
+        raise ValueError(f"No __NEXT_DATA__ script in {path}")
+    data = json.loads(match.group(1))
+    search = data["props"]["pageProps"]["dehydratedState"]["queries"][0]["state"]["data"]
+    return search["listings"], search.get("hits", len(search["listings"]))
+
+
+class SyntheticListings:
+    """Read-only sequence of `count` listings cloned from `templates`"""
+
+    def __init__(self, templates, count, seed=0):
+        self.templates = templates
+        self.count = count
+        rng = random.Random(seed)
+        # Synthetic prices stay inside the captured band, so the captured
+        # search (and its PriceRange filter) still matches every listing
+        captured = [t.get("price", {}).get("price") or 0 for t in templates]
+        low, high = min(captured), max(captured)
+        self.prices = captured[:count]
+        for i in range(len(self.prices), count):
+            price = captured[i % len(templates)] * rng.uniform(0.9, 1.1)
+            self.prices.append(int(min(max(price, low), high)) // 100 * 100)
+        self._base_id = max(int(t["externalId"]) for t in templates) + 1
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        template = self.templates[i % len(self.templates)]
+        if i < len(self.templates):
+            return template
+        listing = dict(template)
+        listing_id = self._base_id + i
+        listing["externalId"] = listing_id
+        listing["uri"] = f"{template['uri'].rsplit('/', 1)[0]}/{listing_id}"
+        listing["price"] = {**template.get("price", {}), "price": self.prices[i],
+                            "displayPrice": f"{self.prices[i]:,} kr".replace(",", ".")}
+        return listing
+
+    def search(self, payload):
+        """Indices matching a search payload, in the requested order"""
+        value = payload.get("selectedFilters", {}).get("PriceRange", {}).get("value", {})
+        low = value.get("fromValue", 0)
+        high = value.get("toValue", float("inf"))
+        indices = [i for i, price in enumerate(self.prices) if low <= price <= high]
+        if payload.get("sortBy") == "price":
+            indices.sort(key=self.prices.__getitem__, reverse=payload.get("sortOrder") == "desc")
+        return indices
+
+
+class ReplayServer:
+    """Threaded local server answering search requests from SyntheticListings"""
+
+    def __init__(self, listings, host="127.0.0.1", port=0, latency=0.0):
+        self.listings = listings
+        self.latency = latency
+        self.requests = 0
+        self._searches = {}
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @classmethod
+    def from_capture(cls, count=None, path=CAPTURE_FILE, seed=0, **kwargs):
+        templates, _ = load_capture(path)
+        return cls(SyntheticListings(templates, count or len(templates), seed), **kwargs)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{SEARCH_PATH}"
+
+    def _matching(self, payload):
+        # A crawl asks for the same search page after page; sort/filter once
+        key = json.dumps({k: v for k, v in payload.items() if k not in ("page", "pageSize")},
+                         sort_keys=True)
+        with self._lock:
+            indices = self._searches.get(key)
+        if indices is None:
+            indices = self.listings.search(payload)
+            with self._lock:
+                self._searches[key] = indices
+        return indices
+
+    def respond(self, payload):
+        """Response body for one search request"""
+        page = max(int(payload.get("page", 1)), 1)
+        page_size = int(payload.get("pageSize", 30))
+        indices = self._matching(payload)
+        start = (page - 1) * page_size
+        return {
+            "listings": [self.listings[i] for i in indices[start:start + page_size]],
+            "pulse": {"@type": "View", "object": {"numItems": len(indices), "pageNumber": page}},
+        }
+
+    @property
+    def page_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{SEARCH_PAGE_PATH}"
+
+    def render_page(self, query):
+        """Search result page HTML for the query string of a /brugt/bil request"""
+        params = {key: values[-1] for key, values in parse_qs(query).items()}
+        price_range = {}
+        if "pricefrom" in params:
+            price_range["fromValue"] = int(params["pricefrom"])
+        if "priceto" in params:
+            price_range["toValue"] = int(params["priceto"])
+        payload = {
+            "selectedFilters": {"PriceRange": {"value": price_range}} if price_range else {},
+            "page": int(params.get("page", 1)),
+            "pageSize": HTML_PAGE_SIZE,
+        }
+        if params.get("sortby"):
+            payload["sortBy"] = params["sortby"]
+            payload["sortOrder"] = params.get("sortorder", "asc")
+        result = self.respond(payload)
+        search = {"listings": result["listings"], "hits": result["pulse"]["object"]["numItems"]}
+        next_data = {"props": {"pageProps": {"dehydratedState": {"queries": [
+            {"queryKey": ["search", {}], "state": {"data": search}}]}}}}
+        # Like Next.js, escape "</" so the JSON cannot end the script early
+        script = json.dumps(next_data, ensure_ascii=False).replace("</", "<\\/")
+        return ('<!DOCTYPE html><html><head><title>Bilbasen</title></head><body><div id="__next"></div>'
+                f'<script id="__NEXT_DATA__" type="application/json">{script}</script></body></html>')
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if self.path.split("?")[0] != SEARCH_PATH:
+                    self.send_error(404)
+                    return
+                try:
+                    payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                except ValueError:
+                    self.send_error(400, "Invalid JSON payload")
+                    return
+                with server._lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                body = json.dumps(server.respond(payload), ensure_ascii=False).encode("utf-8")
+                self._send(body, "application/json; charset=utf-8")
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                if parts.path != SEARCH_PAGE_PATH:
+                    self.send_error(404)
+                    return
+                with server._lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                self._send(server.render_page(parts.query).encode("utf-8"), "text/html; charset=utf-8")
+
+            def _send(self, body, content_type):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay captured Bilbasen search results locally')
+    parser.add_argument('--listings', type=int, help='Number of listings to serve (default: the capture)')
+    parser.add_argument('--capture', type=str, default=CAPTURE_FILE, help='Captured search page HTML')
+    parser.add_argument('--port', type=int, default=8001, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of artificial latency per request')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for synthetic prices')
+    args = parser.parse_args()
+
+    server = ReplayServer.from_capture(args.listings, args.capture, args.seed,
+                                       port=args.port, latency=args.latency)
+    print(f"Serving {len(server.listings)} listings at {server.url} and {server.page_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
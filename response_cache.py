@@ -0,0 +1,145 @@
+"""
+On-disk cache for search API responses.
+
+Entries are keyed by a hash of the request URL and JSON payload (which
+includes the page number). A fresh entry (younger than `ttl` seconds) is
+served without touching the network. A stale entry that carried an ETag or
+Last-Modified header is revalidated with a conditional request. Entries not
+used for `max_age` seconds are evicted, and the cache directory is kept
+under `max_bytes` by evicting least recently used entries.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import serialization
+from atomic_write import write_json_atomic
+
+
+class CacheEntry:
+    __slots__ = ("key", "path", "stored_at", "etag", "last_modified", "body")
+
+    def __init__(self, key, path, stored_at, etag, last_modified, body):
+        self.key = key
+        self.path = path
+        self.stored_at = stored_at
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body = body
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    # Scan the directory for eviction once per this many stores
+    EVICT_EVERY = 50
+
+    def __init__(self, directory="data/.http_cache", ttl=6 * 3600, max_bytes=200 * 1024 * 1024,
+                 max_age=7 * 24 * 3600):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._stores = 0
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key(self, url, payload):
+        blob = json.dumps([url, payload], sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return self.directory / f"{key}.json"
+
+    def lookup(self, url, payload):
+        """Return (key, entry or None); entry.body is the cached JSON response"""
+        key = self.key(url, payload)
+        path = self._path(key)
+        try:
+            stored = serialization.load_file(path)
+        except (FileNotFoundError, ValueError):
+            return key, None
+        entry = CacheEntry(key, path, stored["stored_at"], stored.get("etag"),
+                           stored.get("last_modified"), stored["body"])
+        return key, entry
+
+    def is_fresh(self, entry):
+        return time.time() - entry.stored_at < self.ttl
+
+    def touch(self, entry, revalidated=False):
+        """Mark an entry as used (and as fresh again after a 304).
+
+        Returns False if eviction removed the entry since it was looked up;
+        the caller then fetches it again, and storing that counts the miss.
+        """
+        if revalidated:
+            self._write(entry.path, time.time(), entry.etag, entry.last_modified, entry.body)
+        else:
+            try:
+                # mtime doubles as the LRU clock
+                os.utime(entry.path)
+            except FileNotFoundError:
+                return False
+        with self._lock:
+            if revalidated:
+                self.revalidated += 1
+            else:
+                self.hits += 1
+        return True
+
+    def store(self, key, body, response_headers=None):
+        response_headers = response_headers or {}
+        with self._lock:
+            self.misses += 1
+            self._stores += 1
+            evict = self._stores % self.EVICT_EVERY == 0
+        self._write(self._path(key), time.time(), response_headers.get("ETag"),
+                    response_headers.get("Last-Modified"), body)
+        if evict:
+            self.evict()
+
+    def _write(self, path, stored_at, etag, last_modified, body):
+        write_json_atomic(path, {"stored_at": stored_at, "etag": etag,
+                                 "last_modified": last_modified, "body": body})
+
+    def evict(self):
+        """Drop entries unused for max_age, then LRU entries while over max_bytes"""
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            entries = []
+            for path in self.directory.glob("*.json"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            for mtime, size, path in entries:
+                if total <= self.max_bytes and mtime >= cutoff:
+                    break
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def clear(self):
+        for path in self.directory.glob("*.json"):
+            path.unlink()
+
+    def stats(self):
+        return {"hits": self.hits, "revalidated": self.revalidated, "misses": self.misses}
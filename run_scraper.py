@@ -4,30 +4,235 @@ Simple runner script for the Bilbasen scraper
 """
 
 import argparse
+import os
+import shutil
+from pathlib import Path
+
+import config
+from batch import load_searches, run_batch
+from checkpoint import CrawlCheckpoint, crawl_id
+from compact import RawSpill
 from get_cars import BilbasenScraper
+from html_source import HTML_PAGE_SIZE, client_filters, iter_saved_listings
+from listing_index import ListingIndex
+from metrics import Metrics, profiled
+from rate_control import AdaptiveRateLimiter, RateLimiter
+from response_cache import ResponseCache
+from serialization import BACKENDS, set_backend
+from sharding import load_or_plan_shards, scrape_shards
+
+def finish_checkpoint(checkpoint_dir, collected, total_items):
+    """Drop the checkpoint once the crawl is complete (or found nothing); keep it for --resume otherwise"""
+    if checkpoint_dir is None or not checkpoint_dir.exists():
+        return
+    if not total_items or collected >= total_items:
+        shutil.rmtree(checkpoint_dir)
+    else:
+        print(f"Crawl incomplete ({collected} of {total_items}); resume with --resume")
 
 def main():
     parser = argparse.ArgumentParser(description='Scrape cars from Bilbasen')
-    parser.add_argument('--max-pages', type=int, help='Maximum number of pages to scrape')
-    parser.add_argument('--delay', type=float, default=1.0, help='Delay between requests in seconds')
+    parser.add_argument('--max-pages', type=int, default=config.MAX_PAGES, help='Maximum number of pages to scrape')
+    parser.add_argument('--delay', type=float, default=config.DELAY_BETWEEN_REQUESTS, help='Delay between requests in seconds')
+    parser.add_argument('--concurrency', type=int, default=config.CONCURRENCY, help='Number of pages to fetch in parallel (delay becomes a shared rate limit)')
+    parser.add_argument('--adaptive', action='store_true', help='Adapt the request rate to server latency and errors, starting from --delay')
+    parser.add_argument('--retries', type=int, default=4, help='Retries per page on 429/5xx/timeouts (jittered exponential backoff)')
+    parser.add_argument('--source', choices=['api', 'html'], default='api', help='Read results from the search API or from the HTML search pages')
+    parser.add_argument('--html-fallback', action='store_true', help='Read pages the API fails to deliver from the HTML search pages instead')
+    parser.add_argument('--search-url', type=str, help='Search page URL from the browser, for --source html with filters it cannot map')
+    parser.add_argument('--from-html', nargs='+', metavar='FILE', help='Ingest saved search result pages instead of scraping')
+    parser.add_argument('--pool-size', type=int, default=10, help='Maximum number of pooled keep-alive connections')
+    parser.add_argument('--incremental', action='store_true', help='Sort by newest and stop at the first page with no new or re-priced listings')
+    parser.add_argument('--index', type=str, default=os.path.join(config.OUTPUT_DIR, 'listings.db'), help='SQLite listing index used by --incremental')
+    parser.add_argument('--active-days', type=int, default=7, help='With --incremental, also output indexed listings seen within this many days')
+    parser.add_argument('--batch', nargs='*', metavar='NAME', help='Run the named searches from the config file (all of them if no names are given) concurrently in one process')
+    parser.add_argument('--batch-workers', type=int, help='Searches crawled at once with --batch (default: one per search, up to 4; all share the --delay rate limit)')
+    parser.add_argument('--config', type=str, help='Config file declaring SEARCHES for --batch (default: config.py)')
+    parser.add_argument('--shard', action='store_true', help='Split the search into price bands and crawl them concurrently (--concurrency workers)')
+    parser.add_argument('--shard-max-items', type=int, default=2000, help='Bisect price bands until each has at most this many results')
+    parser.add_argument('--cache-dir', type=str, help='Cache API responses in this directory (re-runs reuse them)')
+    parser.add_argument('--cache-ttl', type=float, default=6 * 3600, help='Seconds a cached response is served without revalidation')
+    parser.add_argument('--cache-max-mb', type=float, default=200, help='Size cap for the response cache')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted crawl of the same search from its checkpoint')
+    parser.add_argument('--checkpoint-dir', type=str, default=os.path.join(config.OUTPUT_DIR, 'checkpoints'), help='Where per-page checkpoints are kept')
+    parser.add_argument('--no-checkpoint', action='store_true', help='Do not checkpoint pages during the crawl')
+    parser.add_argument('--stream', action='store_true', help='Write each page to the output file as it arrives instead of holding all listings in memory')
+    parser.add_argument('--compact', action='store_true', help='Keep scraped listings in a temporary file in the output directory instead of in memory until they are saved')
+    parser.add_argument('--format', choices=['json', 'ndjson'], default='json', help='Output format')
+    parser.add_argument('--indent', type=int, default=2, help='JSON indentation (use 0 for compact output)')
     parser.add_argument('--output', type=str, help='Output filename')
+    parser.add_argument('--json-backend', choices=('auto',) + BACKENDS, default='auto', help='JSON library for decoding pages and writing output (auto: fastest installed)')
+    parser.add_argument('--slim', action='store_true', help='Keep only the listing fields the reports use (make, model, variant, price, properties, first photo, uri, ...)')
+    parser.add_argument('--quiet', action='store_true', help='No per-page log, only a progress line every --progress-interval seconds')
+    parser.add_argument('--progress-interval', type=float, default=30, help='Seconds between progress lines (and metrics file updates)')
+    parser.add_argument('--metrics', type=str, metavar='FILE', help='Write crawl metrics to FILE (Prometheus text format if it ends in .prom, JSON otherwise), updated during the crawl')
+    parser.add_argument('--profile', type=str, metavar='FILE', help='Run under cProfile, save the stats to FILE and print the top functions')
+    parser.add_argument('--trace-memory', action='store_true', help='Trace allocations with tracemalloc and print the peak and top allocation sites')
 
     args = parser.parse_args()
+    if args.stream and args.incremental:
+        parser.error('--stream cannot be combined with --incremental')
+    if args.shard and (args.stream or args.incremental):
+        parser.error('--shard cannot be combined with --stream or --incremental')
+    if args.from_html and (args.shard or args.incremental):
+        parser.error('--from-html cannot be combined with --shard or --incremental')
+    if args.compact and (args.shard or args.stream or args.from_html or args.batch is not None):
+        parser.error('--compact cannot be combined with --shard, --stream, --from-html or --batch')
+    if args.batch is not None and (args.shard or args.stream or args.incremental or args.from_html or args.output):
+        parser.error('--batch cannot be combined with --shard, --stream, --incremental, --from-html or --output')
+    set_backend(args.json_backend)
+
+    metrics = Metrics()
+    metrics.export_path = args.metrics
+    metrics.export_interval = args.progress_interval
+    try:
+        with profiled(args.profile, args.trace_memory, metrics):
+            scrape(args, parser, metrics)
+    finally:
+        print(f"\nMetrics: {metrics.summary()}")
+        if args.metrics:
+            print(f"Metrics written to {metrics.export(args.metrics)}")
 
-    scraper = BilbasenScraper()
+def scrape(args, parser, metrics):
+    indent = args.indent or None
+
+    scraper = BilbasenScraper(pool_size=max(args.pool_size, args.concurrency))
+    scraper.metrics = metrics
+    scraper.quiet = args.quiet
+    scraper.slim = args.slim
+    scraper.progress_interval = args.progress_interval
+    scraper.retry_policy.max_retries = args.retries
+    scraper.html_fallback = args.html_fallback
+    scraper.search_page_url = args.search_url
+    if args.source == 'html':
+        scraper.source = 'html'
+        # One search page per crawl page, so no page is fetched twice
+        scraper.search_payload["pageSize"] = HTML_PAGE_SIZE
+    if args.source == 'html' or args.html_fallback:
+        unmapped = client_filters(scraper.search_payload, args.search_url)
+        if unmapped:
+            print(f"Warning: the search pages have no parameter for {', '.join(unmapped)}; "
+                  "HTML results are filtered on the listing text instead (pass --search-url to avoid this)")
+
+    if args.cache_dir:
+        scraper.cache = ResponseCache(args.cache_dir, ttl=args.cache_ttl,
+                                      max_bytes=int(args.cache_max_mb * 1024 * 1024))
+
+    if args.batch is not None:
+        try:
+            searches = load_searches(args.config, args.batch)
+        except ValueError as e:
+            parser.error(str(e))
+        if not searches:
+            parser.error('No SEARCHES declared in the config file')
+        if args.adaptive:
+            scraper.rate_limiter = AdaptiveRateLimiter(args.delay)
+        print(f"Starting batch of {len(searches)} searches: {', '.join(searches)}")
+        results, merged_path = run_batch(
+            scraper, searches, workers=args.batch_workers, delay=args.delay, max_pages=args.max_pages,
+            fmt=args.format, indent=indent,
+            checkpoint_dir=None if args.no_checkpoint else Path(args.checkpoint_dir),
+            resume=args.resume)
+        if scraper.cache is not None:
+            scraper.cache.evict()
+            print(f"Response cache: {scraper.cache.stats()}")
+        for name, (filepath, count) in results.items():
+            print(f"  {name}: {count} cars" + (f" -> {filepath}" if filepath else ""))
+        if merged_path:
+            print(f"All searches merged into: {merged_path}")
+        return
 
     print("Starting Bilbasen scraper...")
-    print(f"Filters: Electric cars, 250k-300k kr, registered 2024+")
+    print("Filters: " + ", ".join(f"{key}: {value}" for key, value in scraper.describe_filters().items()))
+
+    index = None
+    if args.incremental:
+        index = ListingIndex(args.index)
+        scraper.sort_by_newest()
 
+    writer = None
+    if args.stream:
+        writer = scraper.open_writer(args.output, fmt=args.format, indent=indent)
+
+    # Each search checkpoints into its own directory, named after the search payload
+    checkpoint_dir = None
+    if not args.no_checkpoint and not args.from_html:
+        checkpoint_dir = Path(args.checkpoint_dir) / crawl_id(scraper.search_payload)
+        if not args.resume and checkpoint_dir.exists():
+            print(f"Discarding previous checkpoint {checkpoint_dir} (use --resume to continue it)")
+            shutil.rmtree(checkpoint_dir)
+
+    # With --compact the raw listings wait on disk until they are saved
+    spill = RawSpill(scraper.output_dir) if args.compact else None
+    try:
+        scrape_listings(args, scraper, index, writer, checkpoint_dir, spill, indent)
+    finally:
+        if spill is not None:
+            spill.close()
+
+
+def scrape_listings(args, scraper, index, writer, checkpoint_dir, spill, indent):
     # Scrape data
-    listings, total_items = scraper.scrape_all_pages(
-        max_pages=args.max_pages,
-        delay=args.delay
-    )
+    try:
+        if args.from_html:
+            listings = list(iter_saved_listings(args.from_html))
+            total_items = len(listings)
+            print(f"Read {total_items} listings from {len(args.from_html)} saved pages")
+            if writer is not None:
+                writer.write(listings)
+        elif args.shard:
+            # One request budget shared by the planning probes and every shard
+            if args.adaptive:
+                scraper.rate_limiter = AdaptiveRateLimiter(args.delay)
+            else:
+                scraper.rate_limiter = RateLimiter(args.delay)
+            shards = load_or_plan_shards(scraper, max_items=args.shard_max_items, checkpoint_dir=checkpoint_dir)
+            listings, total_items = scrape_shards(scraper, shards, workers=args.concurrency,
+                                                  delay=args.delay, max_pages=args.max_pages,
+                                                  checkpoint_dir=checkpoint_dir)
+        else:
+            listings, total_items = scraper.scrape_all_pages(
+                max_pages=args.max_pages,
+                delay=args.delay,
+                concurrency=args.concurrency,
+                index=index,
+                writer=writer,
+                keep_listings=writer is None,
+                checkpoint=CrawlCheckpoint(checkpoint_dir, scraper.search_payload) if checkpoint_dir else None,
+                adaptive=args.adaptive,
+                listings=spill
+            )
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+
+    if scraper.cache is not None:
+        scraper.cache.evict()
+        print(f"Response cache: {scraper.cache.stats()}")
+
+    if writer is not None:
+        filepath = writer.close()
+        if writer.count:
+            print(f"\nSuccessfully scraped {writer.count} cars!")
+            print(f"Data saved to: {filepath}")
+        else:
+            print("No data was scraped.")
+        finish_checkpoint(checkpoint_dir, writer.count, total_items)
+        return
+
+    if spill is not None:
+        print(f"Held {len(spill)} listings on disk ({os.path.getsize(spill.path) / 1e6:.1f} MB)")
+
+    if index is not None:
+        # Early stop leaves older listings unfetched; take them from the index
+        print(f"Fetched {len(listings)} listings this run")
+        listings = index.active_listings(args.active_days)
+        index.close()
 
     if listings:
         # Save data
-        filepath = scraper.save_data(listings, args.output)
+        filepath = scraper.save_data(listings, args.output, fmt=args.format, indent=indent)
 
         # Show summary
         summary = scraper.extract_car_summary(listings)
@@ -35,6 +240,7 @@ def main():
         print(f"Data saved to: {filepath}")
     else:
         print("No data was scraped.")
+    finish_checkpoint(checkpoint_dir, len(listings), total_items)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
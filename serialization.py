@@ -0,0 +1,195 @@
+"""
+JSON encoding and decoding with an optional fast backend.
+
+Every API page, checkpoint, cache entry and output file goes through JSON,
+so loads()/dumps() here pick the fastest library installed: orjson, then
+msgspec, then the stdlib json module. All three produce the same text for
+listing data: UTF-8 without ASCII escapes, either compact (no indent) or
+indented by 2. Other indents, and values a fast backend rejects (integers
+beyond 64 bits, non-string keys), fall back to the stdlib. set_backend()
+forces a backend, e.g. "json" to compare.
+
+decode_page(..., slim=True) keeps only the listing fields the scraper and the
+reports use (SlimListing below). With msgspec installed the page is decoded
+straight into that schema, so the rest of the payload (descriptions,
+features, every photo after the first) is skipped while parsing and never
+allocated (unless set_backend("json") asked for the stdlib only). Otherwise
+the full page is decoded and those fields are dropped.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, TypedDict, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+BACKENDS = tuple(name for name, module in (("orjson", orjson), ("msgspec", msgspec)) if module is not None)
+BACKENDS += ("json",)
+_backend = BACKENDS[0]
+
+
+def backend():
+    return _backend
+
+
+def set_backend(name):
+    """Use `name` ("orjson", "msgspec", "json", or "auto" for the fastest installed)"""
+    global _backend
+    if name == "auto":
+        name = BACKENDS[0]
+    if name not in BACKENDS:
+        raise ValueError(f"JSON backend {name!r} is not installed (available: {', '.join(BACKENDS)})")
+    _backend = name
+
+
+def loads(data):
+    """Parse JSON from bytes or str"""
+    if _backend == "orjson":
+        return orjson.loads(data)
+    if _backend == "msgspec":
+        try:
+            return msgspec.json.decode(data)
+        except msgspec.DecodeError as e:
+            # Callers catch ValueError, as raised by json and orjson
+            raise ValueError(str(e)) from e
+    return json.loads(data)
+
+
+def dumps(obj, indent=None, sort_keys=False):
+    """JSON text like json.dumps(obj, indent=indent, ensure_ascii=False).
+
+    Without an indent the output is compact (no spaces after , and :).
+    """
+    if _backend == "orjson" and indent in (None, 2):
+        option = orjson.OPT_INDENT_2 if indent else 0
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, option=option).decode("utf-8")
+        except TypeError:
+            pass
+    if _backend == "msgspec" and indent is None and not sort_keys:
+        try:
+            return msgspec.json.encode(obj).decode("utf-8")
+        except (TypeError, msgspec.EncodeError):
+            pass
+    separators = None if indent is not None else (",", ":")
+    return json.dumps(obj, indent=indent, ensure_ascii=False, sort_keys=sort_keys, separators=separators)
+
+
+def load_file(path):
+    """Parse a JSON file"""
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+# Listing fields kept by a slim decode. Besides what normalize_listings reads,
+# this keeps externalId (listing identity), title and location (logs and
+# summaries). Only the first picture is kept, as media[0].
+class Property(TypedDict, total=False):
+    displayTextShort: Optional[str]
+
+
+class Properties(TypedDict, total=False):
+    firstregistrationdate: Property
+    batterycapacity: Property
+    mileage: Property
+    electricmotorrange: Property
+    hk: Property
+    geartype: Property
+    fueltype: Property
+
+
+class Price(TypedDict, total=False):
+    price: Optional[int]
+    displayPrice: Optional[str]
+
+
+class Media(TypedDict, total=False):
+    mediaType: Optional[str]
+    url: Optional[str]
+
+
+class Location(TypedDict, total=False):
+    city: Optional[str]
+    region: Optional[str]
+
+
+class SlimListing(TypedDict, total=False):
+    externalId: Union[int, str, None]
+    uri: Optional[str]
+    title: Optional[str]
+    make: Optional[str]
+    model: Optional[str]
+    variant: Optional[str]
+    doors: Optional[int]
+    price: Optional[Price]
+    location: Optional[Location]
+    properties: Optional[Properties]
+    media: Optional[List[Media]]
+
+
+class SlimPage(TypedDict, total=False):
+    listings: List[SlimListing]
+    pulse: Dict[str, Any]
+
+
+_LISTING_FIELDS = tuple(SlimListing.__annotations__)
+_PROPERTY_FIELDS = tuple(Properties.__annotations__)
+_PRICE_FIELDS = tuple(Price.__annotations__)
+_LOCATION_FIELDS = tuple(Location.__annotations__)
+_slim_decoder = msgspec.json.Decoder(SlimPage) if msgspec is not None else None
+
+
+def _first_picture_only(media):
+    for m in media or ():
+        if m.get("mediaType") == "Picture":
+            return [{"mediaType": "Picture", "url": m.get("url")}]
+    return []
+
+
+def slim_listing(listing):
+    """Copy of a decoded listing with only the SlimListing fields"""
+    slim = {name: listing[name] for name in _LISTING_FIELDS if name in listing}
+    for name, fields in (("price", _PRICE_FIELDS), ("location", _LOCATION_FIELDS)):
+        value = listing.get(name)
+        if value:
+            slim[name] = {field: value[field] for field in fields if field in value}
+    properties = listing.get("properties")
+    if properties:
+        slim["properties"] = {name: {"displayTextShort": properties[name].get("displayTextShort")}
+                              for name in _PROPERTY_FIELDS if name in properties}
+    if "media" in listing:
+        slim["media"] = _first_picture_only(listing["media"])
+    return slim
+
+
+def decode_page(data, slim=False):
+    """Parse an API page; with slim=True its listings keep only the SlimListing fields"""
+    if not slim:
+        return loads(data)
+    if _slim_decoder is not None and _backend != "json":
+        try:
+            page = _slim_decoder.decode(data)
+        except msgspec.ValidationError:
+            # A field of an unexpected type; take the untyped route
+            page = None
+        except msgspec.DecodeError as e:
+            # Not JSON at all (an HTML error page, say); callers catch ValueError
+            raise ValueError(str(e)) from e
+        if page is not None:
+            for listing in page.get("listings", ()):
+                if "media" in listing:
+                    listing["media"] = _first_picture_only(listing["media"])
+            return page
+    page = loads(data)
+    if isinstance(page, dict) and "listings" in page:
+        page["listings"] = [slim_listing(listing) for listing in page["listings"]]
+    return page
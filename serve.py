@@ -1,15 +1,328 @@
+"""
+Static server for the reports and the scraped data.
+
+By default this is the plain SimpleHTTPRequestHandler, now on a threaded
+server so one slow client does not hold up the others.
+
+--production adds a fast path for regular files. Each file is read once and
+kept in memory together with its gzip variant (and brotli, if the brotli
+module is installed), compressed once per file version rather than per
+request. The cache is keyed on path and checked against the file's mtime and
+size on every request, so a freshly scraped latest_cars.json is picked up
+without a restart. Least recently used files are dropped past --cache-mb,
+and files over --max-file-mb are served from disk as before.
+
+Every response carries a strong ETag derived from the content (one per
+encoding, as strong validators must differ between representations) and
+Cache-Control: no-cache, so browsers revalidate and get a 304 with no body
+when nothing changed. Single byte ranges (Range / If-Range) are served from
+the uncompressed bytes, so a client can fetch a large JSON file in parts or
+resume an interrupted download.
+"""
+
+import argparse
+import email.utils
+import gzip
+import hashlib
 import http.server
-import socketserver
+import mimetypes
 import os
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 PORT = 8000
 DIRECTORY = os.path.dirname(os.path.abspath(__file__))
 
+# Types worth compressing; images and archives are already compressed
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml", "application/xml")
+MIN_COMPRESS_SIZE = 1024
+
+
 class Handler(http.server.SimpleHTTPRequestHandler):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory=DIRECTORY, **kwargs)
 
+
+def guess_type(path):
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+class CachedFile:
+    """One version of a file: its bytes, compressed variants and validators"""
+    __slots__ = ("mtime_ns", "size", "content_type", "last_modified", "etag", "variants")
+
+    def __init__(self, path, stat):
+        content_type = guess_type(path)
+        with open(path, "rb") as f:
+            data = f.read()
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = len(data)
+        self.content_type = content_type
+        self.last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+        self.etag = hashlib.blake2b(data, digest_size=12).hexdigest()
+        self.variants = {"identity": data}
+        if self.size >= MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(compressed) < self.size:
+                self.variants["gzip"] = compressed
+            if brotli is not None:
+                # Quality 11 takes minutes on a large JSON file; 9 is close in size
+                compressed = brotli.compress(data, quality=11 if self.size < 1 << 20 else 9)
+                if len(compressed) < self.size:
+                    self.variants["br"] = compressed
+
+    def matches(self, stat):
+        return stat.st_mtime_ns == self.mtime_ns and stat.st_size == self.size
+
+    def tag(self, encoding):
+        if encoding == "identity":
+            return f'"{self.etag}"'
+        return f'"{self.etag}-{encoding}"'
+
+    def nbytes(self):
+        return sum(len(v) for v in self.variants.values())
+
+
+class FileCache:
+    """LRU of CachedFile by path, bounded by the total bytes held"""
+
+    def __init__(self, max_bytes, max_file_bytes):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # One lock per path being loaded, so concurrent first requests compress it once
+        self._loading = {}
+
+    def nbytes(self):
+        return self._bytes
+
+    def get(self, path, stat):
+        """The cached version of `path`, loading it if missing or stale; None if too large"""
+        if stat.st_size > self.max_file_bytes:
+            return None
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.matches(stat):
+                self._entries.move_to_end(path)
+                return entry
+            loading = self._loading.setdefault(path, threading.Lock())
+        with loading:
+            try:
+                with self._lock:
+                    entry = self._entries.get(path)
+                    if entry is not None and entry.matches(stat):
+                        return entry
+                entry = CachedFile(path, stat)
+                with self._lock:
+                    old = self._entries.pop(path, None)
+                    if old is not None:
+                        self._bytes -= old.nbytes()
+                    self._entries[path] = entry
+                    self._bytes += entry.nbytes()
+                    while self._bytes > self.max_bytes and len(self._entries) > 1:
+                        _, evicted = self._entries.popitem(last=False)
+                        self._bytes -= evicted.nbytes()
+            finally:
+                with self._lock:
+                    self._loading.pop(path, None)
+        return entry
+
+
+def accepted_encodings(header):
+    """Encodings from an Accept-Encoding header with a non-zero q-value"""
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            accepted.add(name)
+    return accepted
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single 'bytes=' range; None to ignore the header, False if unsatisfiable"""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        # Multipart ranges are not supported; the full body is a valid answer
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                return False
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if last and start > end:
+        return None
+    if start >= size:
+        return False
+    return start, min(end, size - 1)
+
+
+class ProductionHandler(Handler):
+    """Serves regular files from a FileCache with compression, ETags and ranges"""
+    protocol_version = "HTTP/1.1"
+    cache = None
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            if not self.path.split("?", 1)[0].endswith("/"):
+                # The redirect to the trailing slash, and directory listings
+                return super().send_head()
+            path = os.path.join(path, "index.html")
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return super().send_head()
+        entry = self.cache.get(path, stat)
+        if entry is None:
+            return super().send_head()
+
+        encoding = "identity"
+        byte_range = None
+        range_header = self.headers.get("Range")
+        if range_header and self._if_range_holds(entry):
+            byte_range = parse_range(range_header, entry.size)
+        if byte_range is None:
+            accepted = accepted_encodings(self.headers.get("Accept-Encoding"))
+            for candidate in ("br", "gzip"):
+                if candidate in entry.variants and candidate in accepted:
+                    encoding = candidate
+                    break
+        etag = entry.tag(encoding)
+
+        if self._not_modified(entry):
+            self.send_response(304)
+            self._send_validators(entry, etag)
+            self.end_headers()
+            return None
+
+        if byte_range is False:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{entry.size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return None
+
+        body = entry.variants[encoding]
+        if byte_range is not None:
+            start, end = byte_range
+            body = memoryview(body)[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{entry.size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", entry.content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Accept-Ranges", "bytes")
+        if encoding != "identity":
+            self.send_header("Content-Encoding", encoding)
+        self._send_validators(entry, etag)
+        self.end_headers()
+        return body
+
+    def _send_validators(self, entry, etag):
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", entry.last_modified)
+        self.send_header("Cache-Control", "no-cache")
+        if len(entry.variants) > 1:
+            self.send_header("Vary", "Accept-Encoding")
+
+    def _not_modified(self, entry):
+        """If-None-Match against any representation of this version (weak comparison)"""
+        header = self.headers.get("If-None-Match")
+        if header is None:
+            return self.headers.get("If-Modified-Since") == entry.last_modified
+        if header.strip() == "*":
+            return True
+        tags = {entry.tag(encoding) for encoding in entry.variants}
+        return any(tag.strip().removeprefix("W/") in tags for tag in header.split(","))
+
+    def _if_range_holds(self, entry):
+        """A Range applies unless If-Range names another version (strong comparison)"""
+        validator = self.headers.get("If-Range")
+        if validator is None:
+            return True
+        validator = validator.strip()
+        if validator.startswith('"'):
+            return validator == entry.tag("identity")
+        return validator == entry.last_modified
+
+    def copyfile(self, source, outputfile):
+        if isinstance(source, (bytes, memoryview)):
+            outputfile.write(source)
+        else:
+            super().copyfile(source, outputfile)
+
+    def do_GET(self):
+        body = self.send_head()
+        if body is None:
+            return
+        try:
+            self.copyfile(body, self.wfile)
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+
+    def do_HEAD(self):
+        body = self.send_head()
+        if body is not None and hasattr(body, "close"):
+            body.close()
+
+
+def warm(cache, directory):
+    """Load the report pages and the latest data into the cache up front"""
+    for name in sorted(os.listdir(directory)) + ["data/latest_cars.json"]:
+        path = os.path.join(directory, name)
+        if name.endswith((".html", ".json")) and os.path.isfile(path):
+            cache.get(path, os.stat(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the reports and scraped data')
+    parser.add_argument('--port', type=int, default=PORT, help='Port to listen on')
+    parser.add_argument('--bind', type=str, default='', help='Address to bind (default: all interfaces)')
+    parser.add_argument('--production', action='store_true', help='Serve files from memory with gzip/brotli, ETags and range support')
+    parser.add_argument('--cache-mb', type=float, default=256, help='With --production, memory for cached files and their compressed variants')
+    parser.add_argument('--max-file-mb', type=float, default=64, help='With --production, files larger than this are served from disk uncached')
+    parser.add_argument('--no-warm', action='store_true', help='With --production, do not load the reports and latest data at startup')
+    args = parser.parse_args()
+
+    handler = Handler
+    if args.production:
+        cache = FileCache(int(args.cache_mb * 1024 * 1024), int(args.max_file_mb * 1024 * 1024))
+        handler = type("Handler", (ProductionHandler,), {"cache": cache})
+        if not args.no_warm:
+            warm(cache, DIRECTORY)
+        print(f"Production mode: gzip{', brotli' if brotli is not None else ''} "
+              f"({cache.nbytes() / 1e6:.1f} MB cached at startup)")
+
+    with http.server.ThreadingHTTPServer((args.bind, args.port), handler) as httpd:
+        print(f"Serving at http://localhost:{args.port}")
+        httpd.serve_forever()
+
+
 if __name__ == "__main__":
-    with socketserver.TCPServer(("", PORT), Handler) as httpd:
-        print(f"Serving at http://localhost:{PORT}")
-        httpd.serve_forever() 
\ No newline at end of file
+    main()
@@ -0,0 +1,170 @@
+"""
+Search-space sharding for full-market crawls.
+
+plan_shards() splits one search into disjoint PriceRange bands, probing the
+result count of each band and bisecting any band that still holds more than
+`max_items` results. Price ends the search leaves open stay open in the
+outermost bands, so listings above DEFAULT_MAX_PRICE are not cut off, and the
+shard counts are checked against the unsharded total. scrape_shards() then
+crawls the shards concurrently, sharing one session and rate limiter, and
+merges the listings with de-duplication by listing id. With a checkpoint
+directory, the shard plan and every shard's pages are persisted so an
+interrupted crawl can resume.
+"""
+
+import copy
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from checkpoint import CrawlCheckpoint
+from listing_index import listing_id
+from rate_control import RateLimiter
+
+DEFAULT_MAX_PRICE = 20_000_000
+MIN_BAND_WIDTH = 1000
+
+
+def price_band(selected_filters):
+    """(from, to) of the PriceRange filter, None for an open end"""
+    value = selected_filters.get("PriceRange", {}).get("value", {})
+    return value.get("fromValue"), value.get("toValue")
+
+
+def band_label(low, high):
+    if low is None and high is None:
+        return "any price"
+    if low is None:
+        return f"up to {high:,} kr"
+    if high is None:
+        return f"{low:,}+ kr"
+    return f"{low:,}-{high:,} kr"
+
+
+def with_price_band(selected_filters, low, high):
+    """Copy of the filters limited to [low, high]; a None end is left open"""
+    filters = copy.deepcopy(selected_filters)
+    value = {}
+    if low is not None:
+        value["fromValue"] = low
+    if high is not None:
+        value["toValue"] = high
+    if value:
+        filters["PriceRange"] = {"value": value}
+    else:
+        filters.pop("PriceRange", None)
+    return filters
+
+
+def plan_shards(scraper, max_items=2000):
+    """List of (selectedFilters, numItems) shards covering the scraper's search.
+
+    Bands are inclusive integer ranges, so [low, mid] and [mid + 1, high]
+    never overlap. A band narrower than MIN_BAND_WIDTH is kept even if it
+    is still over the limit. The count probes are paced by the scraper's
+    rate_limiter, so set it before planning to share one budget with the
+    crawl (scrape_shards reuses it).
+    """
+    base_filters = scraper.search_payload["selectedFilters"]
+    total = scraper.count_items()
+    if total is None:
+        raise RuntimeError("Could not count results for the search")
+    pending = [price_band(base_filters)]
+    shards = []
+    while pending:
+        low, high = pending.pop()
+        filters = with_price_band(base_filters, low, high)
+        count = scraper.for_filters(filters).count_items()
+        if count is None:
+            raise RuntimeError(f"Could not count results for price band {band_label(low, high)}")
+        if count == 0:
+            continue
+        # Open ends are split as if bounded by 0 and DEFAULT_MAX_PRICE, keeping the outer parts open
+        bottom = 0 if low is None else low
+        top = DEFAULT_MAX_PRICE if high is None else high
+        if count > max_items and top - bottom >= MIN_BAND_WIDTH:
+            mid = (bottom + top) // 2
+            pending.append((mid + 1, high))
+            pending.append((low, mid))
+            continue
+        if count > max_items:
+            print(f"Shard {band_label(low, high)} still has {count} results, keeping it")
+        print(f"Planned shard {band_label(low, high)} ({count} results)")
+        shards.append((filters, count))
+    shards.sort(key=lambda shard: price_band(shard[0])[0] or 0)
+    # Empty bands were dropped; stretch the shards over them (and out to the
+    # search's own ends) so listings priced into those gaps later are still covered
+    base_low, base_high = price_band(base_filters)
+    for i, (filters, count) in enumerate(shards):
+        low = base_low if i == 0 else price_band(filters)[0]
+        high = base_high if i == len(shards) - 1 else price_band(shards[i + 1][0])[0] - 1
+        shards[i] = with_price_band(base_filters, low, high), count
+    planned = sum(count for _, count in shards)
+    if planned != total:
+        # e.g. listings without a price, which no PriceRange band matches
+        print(f"Warning: the shards hold {planned} results but the unsharded search has {total}")
+    return shards
+
+
+def load_or_plan_shards(scraper, max_items=2000, checkpoint_dir=None):
+    """plan_shards(), reusing a plan saved in `checkpoint_dir` by an earlier run"""
+    if checkpoint_dir is None:
+        return plan_shards(scraper, max_items)
+    plan_path = Path(checkpoint_dir) / "shards.json"
+    try:
+        with open(plan_path, "r", encoding="utf-8") as f:
+            plan = json.load(f)
+        if plan["max_items"] == max_items:
+            print(f"Reusing shard plan from {plan_path}")
+            return [(filters, count) for filters, count in plan["shards"]]
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+    shards = plan_shards(scraper, max_items)
+    plan_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(plan_path, "w", encoding="utf-8") as f:
+        json.dump({"max_items": max_items, "shards": shards}, f, ensure_ascii=False)
+    return shards
+
+
+def scrape_shards(scraper, shards, workers=4, delay=1, max_pages=None, checkpoint_dir=None):
+    """Crawl shards concurrently and merge their listings, de-duplicated by id.
+
+    All shards share the scraper's session and one RateLimiter, so `delay`
+    is the minimum interval between any two requests across all workers.
+    With `checkpoint_dir`, each shard checkpoints its pages in a
+    subdirectory, and shards a previous run completed are read back from
+    their saved pages without crawling them again.
+
+    Returns the merged listings and the sum of the shard totals reported
+    during the crawl (the plan's counts only stand in for shards that
+    reported none), so it reflects listings removed since planning.
+    """
+    if scraper.rate_limiter is None:
+        scraper.rate_limiter = RateLimiter(delay)
+
+    def crawl(filters):
+        shard_scraper = scraper.for_filters(filters)
+        checkpoint = None
+        if checkpoint_dir is not None:
+            checkpoint = CrawlCheckpoint.for_search(checkpoint_dir, shard_scraper.search_payload)
+            if checkpoint.complete:
+                listings = checkpoint.listings()
+                print(f"Shard {band_label(*price_band(filters))} already complete, {len(listings)} listings from its checkpoint")
+                return listings, checkpoint.total_items
+        listings, total_items = shard_scraper.scrape_all_pages(max_pages=max_pages, delay=0,
+                                                               checkpoint=checkpoint)
+        if checkpoint is not None and len(listings) >= (total_items or 0):
+            checkpoint.mark_complete(total_items)
+        return listings, total_items
+
+    merged = {}
+    expected = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(crawl, [filters for filters, _ in shards])
+        for (filters, count), (listings, total_items) in zip(shards, results):
+            expected += count if total_items is None else total_items
+            for listing in listings:
+                merged.setdefault(listing_id(listing), listing)
+    print(f"Merged {len(merged)} unique listings from {len(shards)} shards "
+          f"({expected} results reported)")
+    return list(merged.values()), expected
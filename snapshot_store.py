@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Append-only history of normalized listings, partitioned by month.
+
+Layout under the store directory (data/snapshots by default):
+
+    manifest.json           one entry per snapshot day, oldest first
+    index.db                SQLite index of every stored row version (derived)
+    2026-10/                one directory per month
+        2026-10-01.columns  first snapshot of the month: the full listing set
+        2026-10-02.columns  later days: only new or changed rows
+        2026-10-02.removed.json  ids of listings gone since the day before
+
+Rows are normalized CarTable rows plus the listing id, stored in the .columns
+format. A listing that did not change since the previous snapshot is not
+written again, so a day costs only its new and changed rows; the full base
+at the start of each month keeps any day reconstructible from its own month
+alone. The index (id, make, model, day) answers per-listing history and
+tells queries which months hold a make/model at all, so trend queries read
+only the partitions they need.
+
+The manifest and the partition files are the store; index.db is derived
+from them. A snapshot is committed by rewriting the manifest, after its
+files are in place, and the index is brought in line with the manifest
+whenever the store is opened. So a crash between the two only costs a
+re-index, and index.db need not be kept in version control (only the
+manifest and partitions are published).
+
+Adding a day that is already the last one replaces it, so re-running a
+scrape on the same day updates that day's snapshot.
+"""
+
+import argparse
+import json
+import sqlite3
+from collections import defaultdict
+from datetime import date
+from pathlib import Path
+
+import serialization
+from aggregates import summarize
+from atomic_write import write_json_atomic
+from columnar import ColumnarFile, write_columnar
+from listing_index import listing_id
+from normalize import COLUMNS, normalize_listings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    id TEXT NOT NULL,
+    make TEXT,
+    model TEXT,
+    day TEXT NOT NULL,
+    partition TEXT NOT NULL,
+    price INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_versions_model ON versions (make, model, partition);
+CREATE INDEX IF NOT EXISTS idx_versions_id ON versions (id, day);
+"""
+
+
+class SnapshotStore:
+    def __init__(self, directory="data/snapshots"):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.directory / "manifest.json"
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {"snapshots": []}
+        self.conn = sqlite3.connect(str(self.directory / "index.db"))
+        self.conn.executescript(SCHEMA)
+        self._sync_index()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def snapshots(self):
+        return self.manifest["snapshots"]
+
+    def days(self, start=None, end=None):
+        return [entry["day"] for entry in self._entries(start, end)]
+
+    def _entries(self, start=None, end=None):
+        return [entry for entry in self.snapshots
+                if (start is None or entry["day"] >= start) and (end is None or entry["day"] <= end)]
+
+    def _path(self, entry, suffix=".columns"):
+        return self.directory / entry["partition"] / f"{entry['day']}{suffix}"
+
+    def _sync_index(self):
+        """Re-index the manifest days whose rows are missing or incomplete, drop the others"""
+        counts = dict(self.conn.execute("SELECT day, COUNT(*) FROM versions GROUP BY day"))
+        days = {entry["day"] for entry in self.snapshots}
+        with self.conn:
+            for day in counts.keys() - days:
+                self.conn.execute("DELETE FROM versions WHERE day = ?", (day,))
+            for entry in self.snapshots:
+                if counts.get(entry["day"], 0) != entry["rows"]:
+                    self._index_entry(entry)
+
+    def _index_entry(self, entry):
+        with ColumnarFile(self._path(entry)) as f:
+            rows = zip(f.column("listing_id"), f.column("make"), f.column("model"), f.column("price"))
+            rows = [(lid, make, model, entry["day"], entry["partition"], price) for lid, make, model, price in rows]
+        self.conn.execute("DELETE FROM versions WHERE day = ?", (entry["day"],))
+        self.conn.executemany(
+            "INSERT INTO versions (id, make, model, day, partition, price) VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def add_snapshot(self, listings, day=None):
+        """Store one day's listings; returns its manifest entry.
+
+        Days must be added in order; adding the last day again replaces it.
+        """
+        day = day or date.today().isoformat()
+        partition = day[:7]
+        if self.snapshots and self.snapshots[-1]["day"] == day:
+            # Rebuilt against the day before; the manifest on disk keeps the old entry until committed
+            self.snapshots.pop()
+        previous = self.snapshots[-1] if self.snapshots else None
+        if previous is not None and day < previous["day"]:
+            raise ValueError(f"Snapshot for {day} is older than the last one ({previous['day']})")
+
+        # One row per listing id; the first occurrence wins
+        by_id = {}
+        for listing in listings:
+            by_id.setdefault(listing_id(listing), listing)
+        table = normalize_listings(by_id.values())
+        ids = list(by_id)
+        rows = zip(*(table.column(name) for name in COLUMNS))
+        current = dict(zip(ids, rows))
+
+        before = self.state(previous["day"]) if previous is not None else {}
+        is_base = previous is None or previous["partition"] != partition
+        changed = [i for i, lid in enumerate(ids) if lid in before and before[lid] != current[lid]]
+        new = [i for i, lid in enumerate(ids) if lid not in before]
+        removed = [lid for lid in before if lid not in current]
+        keep = range(len(ids)) if is_base else sorted(changed + new)
+
+        (self.directory / partition).mkdir(exist_ok=True)
+        entry = {"day": day, "partition": partition, "base": is_base, "listings": len(ids),
+                 "new": len(new), "changed": len(changed), "removed": len(removed),
+                 "rows": len(keep)}
+        subset = normalize_listings([])
+        for name in COLUMNS:
+            column = table.column(name)
+            setattr(subset, name, [column[i] for i in keep])
+        write_columnar(subset, self._path(entry), {"listing_id": [ids[i] for i in keep]})
+        removed_path = self._path(entry, ".removed.json")
+        if not is_base:
+            write_json_atomic(removed_path, removed, indent=1)
+        elif removed_path.exists():
+            removed_path.unlink()
+
+        self.snapshots.append(entry)
+        write_json_atomic(self.manifest_path, self.manifest, indent=1)
+        with self.conn:
+            self._index_entry(entry)
+        return entry
+
+    def _read_rows(self, entry, make=None, model=None, fields=COLUMNS):
+        """({id: row tuple} of matching rows, set of all ids) for one day file"""
+        with ColumnarFile(self._path(entry)) as f:
+            ids = f.column("listing_id")
+            keep = range(f.rows)
+            if make is not None:
+                makes = f.column("make")
+                keep = [i for i in keep if makes[i] == make]
+            if model is not None:
+                models = f.column("model")
+                keep = [i for i in keep if models[i] == model]
+            columns = [f.column(name) for name in fields]
+        rows = {ids[i]: tuple(column[i] for column in columns) for i in keep}
+        return rows, ids
+
+    def _partitions_with(self, make, model):
+        if make is None and model is None:
+            return None
+        query = "SELECT DISTINCT partition FROM versions WHERE 1 = 1"
+        params = []
+        if make is not None:
+            query += " AND make = ?"
+            params.append(make)
+        if model is not None:
+            query += " AND model = ?"
+            params.append(model)
+        return {partition for (partition,) in self.conn.execute(query, params)}
+
+    def iter_states(self, start=None, end=None, make=None, model=None, fields=COLUMNS):
+        """Yield (day, {id: row}) for every snapshot day in [start, end].
+
+        Only the partitions overlapping the range, and among those only the
+        ones holding the requested make/model, are read. Each partition is
+        replayed from its base, so the yielded dict is updated in place from
+        one day to the next; copy it to keep it.
+        """
+        wanted = self._partitions_with(make, model)
+        by_partition = defaultdict(list)
+        for entry in self.snapshots:
+            if end is not None and entry["day"] > end:
+                break
+            by_partition[entry["partition"]].append(entry)
+        for partition, entries in by_partition.items():
+            if start is not None and entries[-1]["day"] < start:
+                continue
+            if wanted is not None and partition not in wanted:
+                for entry in entries:
+                    if start is None or entry["day"] >= start:
+                        yield entry["day"], {}
+                continue
+            state = {}
+            for entry in entries:
+                rows, ids = self._read_rows(entry, make, model, fields)
+                if entry["base"]:
+                    state = rows
+                else:
+                    # A row that no longer matches the filter (e.g. a renamed model) drops out
+                    for lid in ids:
+                        state.pop(lid, None)
+                    state.update(rows)
+                    with open(self._path(entry, ".removed.json"), "r", encoding="utf-8") as f:
+                        for lid in json.load(f):
+                            state.pop(lid, None)
+                if start is None or entry["day"] >= start:
+                    yield entry["day"], state
+
+    def state(self, day, make=None, model=None, fields=COLUMNS):
+        """{id: row} of the listings present on `day` (a snapshot day)"""
+        for snapshot_day, state in self.iter_states(day, day, make, model, fields):
+            return dict(state)
+        raise KeyError(f"No snapshot for {day}")
+
+    def trend(self, make=None, model=None, start=None, end=None, field="price"):
+        """Per snapshot day: listing count, ids new/gone since the day before and a summary of `field`"""
+        points = []
+        previous = None
+        for day, state in self.iter_states(start, end, make, model, (field,)):
+            ids = set(state)
+            point = {"day": day}
+            point.update(summarize([row[0] for row in state.values() if row[0] is not None]))
+            # count is listings on the day, including those without a value for `field`
+            point["count"] = len(state)
+            point["new"] = len(ids - previous) if previous is not None else None
+            point["removed"] = len(previous - ids) if previous is not None else None
+            points.append(point)
+            previous = ids
+        return points
+
+    def model_trends(self, start=None, end=None, field="price"):
+        """{(make, model): [(day, summary of field)]} over all models, in one pass"""
+        trends = defaultdict(list)
+        for day, state in self.iter_states(start, end, fields=("make", "model", field)):
+            buckets = defaultdict(list)
+            for make, model, value in state.values():
+                buckets[(make, model)].append(value)
+            for key, values in buckets.items():
+                summary = summarize([value for value in values if value is not None])
+                summary["count"] = len(values)
+                trends[key].append((day, summary))
+        return trends
+
+    def listing_history(self, lid):
+        """[(day, make, model, price)] for every stored version of one listing"""
+        rows = self.conn.execute(
+            "SELECT day, make, model, price FROM versions WHERE id = ? ORDER BY day", (str(lid),))
+        return rows.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Listing snapshot history')
+    parser.add_argument('--dir', type=str, default='data/snapshots', help='Snapshot store directory')
+    commands = parser.add_subparsers(dest='command', required=True)
+    add = commands.add_parser('add', help='Store a scraped data file as a snapshot')
+    add.add_argument('data', help='Scraped JSON file (e.g. data/latest_cars.json)')
+    add.add_argument('--day', type=str, help='Snapshot day (YYYY-MM-DD, default today)')
+    trend = commands.add_parser('trend', help='Print price and supply per snapshot day')
+    trend.add_argument('--make', type=str)
+    trend.add_argument('--model', type=str)
+    trend.add_argument('--start', type=str, help='First day (YYYY-MM-DD)')
+    trend.add_argument('--end', type=str, help='Last day (YYYY-MM-DD)')
+    trend.add_argument('--field', type=str, default='price', help='Normalized column to summarize')
+    history = commands.add_parser('history', help='Print the stored versions of one listing')
+    history.add_argument('id', help='Listing id (externalId)')
+    args = parser.parse_args()
+
+    with SnapshotStore(args.dir) as store:
+        if args.command == 'add':
+            listings = serialization.load_file(args.data).get("listings", [])
+            entry = store.add_snapshot(listings, args.day)
+            print(f"Snapshot {entry['day']}: {entry['listings']} listings, {entry['new']} new, "
+                  f"{entry['changed']} changed, {entry['removed']} removed, {entry['rows']} rows stored")
+        elif args.command == 'trend':
+            if args.field not in COLUMNS:
+                parser.error(f"--field must be one of {', '.join(COLUMNS)}")
+            print(f"{'day':<10} {'count':>6} {'new':>5} {'gone':>5} {'min':>10} {'median':>10} {'max':>10}")
+            for point in store.trend(args.make, args.model, args.start, args.end, args.field):
+                cells = [f"{point[name]:>10,.0f}" if point[name] is not None else f"{'-':>10}"
+                         for name in ("min", "median", "max")]
+                new = "-" if point["new"] is None else point["new"]
+                removed = "-" if point["removed"] is None else point["removed"]
+                print(f"{point['day']:<10} {point['count']:>6} {new:>5} {removed:>5} {' '.join(cells)}")
+        else:
+            for day, make, model, price in store.listing_history(args.id):
+                print(f"{day}  {make} {model}  {price:,} kr" if price is not None else f"{day}  {make} {model}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Local thumbnail cache for report images.
+
+Reports show one photo per model, taken from billeder.bilbasen.dk at full
+size. ThumbnailCache downloads each distinct image URL once through a
+bounded pool of workers, shrinks it (when Pillow is installed; otherwise the
+original bytes are kept) and stores it under its content hash, so identical
+photos behind different URLs share one file. index.json maps URLs to files
+per thumbnail size ("original" without Pillow), so rebuilds only fetch URLs
+they have not seen at that size. File mtimes act as the LRU clock, and
+evict() keeps the directory under `max_bytes`.
+
+localize_images() points a CarTable's model images at the local thumbnails,
+relative to the directory the reports are written to.
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+from atomic_write import write_atomic, write_json_atomic
+from transport import create_session
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+CONTENT_TYPES = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp", "image/gif": ".gif"}
+
+
+def make_thumbnail(data, size):
+    """(bytes, extension) of an image shrunk to fit `size`; unchanged without Pillow"""
+    if Image is None:
+        return data, None
+    with Image.open(io.BytesIO(data)) as image:
+        image.thumbnail(size)
+        output = io.BytesIO()
+        image.convert("RGB").save(output, "JPEG", quality=80, optimize=True)
+    return output.getvalue(), ".jpg"
+
+
+class ThumbnailCache:
+    def __init__(self, directory="thumbs", size=(320, 240), max_bytes=100 * 1024 * 1024,
+                 workers=8, timeout=30, session=None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.size = size
+        self.variant = f"{size[0]}x{size[1]}" if Image is not None else "original"
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.timeout = timeout
+        self.session = session or create_session(workers)
+        self.index_path = self.directory / "index.json"
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.index = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.index = {}
+        self.fetched = 0
+        self.failed = 0
+        self.bytes_fetched = 0
+        self._lock = threading.Lock()
+
+    def _key(self, url):
+        return f"{self.variant} {url}"
+
+    def path(self, url):
+        """Local file for a URL at this cache's size, or None if it is not cached"""
+        name = self.index.get(self._key(url))
+        if name is None or not (self.directory / name).exists():
+            return None
+        return self.directory / name
+
+    def fetch_all(self, urls):
+        """{url: local path} for every URL, downloading the ones not cached yet.
+
+        URLs are de-duplicated first; URLs that fail to download are left out
+        of the result.
+        """
+        unique = [url for url in dict.fromkeys(urls) if url]
+        missing = [url for url in unique if self.path(url) is None]
+        if missing:
+            print(f"Fetching {len(missing)} images ({len(unique) - len(missing)} already cached)")
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for url, name in zip(missing, pool.map(self._fetch, missing)):
+                    if name is not None:
+                        self.index[self._key(url)] = name
+            self._save_index()
+        paths = {}
+        for url in unique:
+            path = self.path(url)
+            if path is not None:
+                # Mark as recently used for LRU eviction
+                os.utime(path)
+                paths[url] = path
+        return paths
+
+    def _fetch(self, url):
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            data, extension = make_thumbnail(response.content, self.size)
+        except (requests.exceptions.RequestException, OSError, ValueError) as e:
+            print(f"Error fetching image {url}: {e}")
+            with self._lock:
+                self.failed += 1
+            return None
+        if extension is None:
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+            extension = CONTENT_TYPES.get(content_type, ".img")
+        name = hashlib.sha256(data).hexdigest() + extension
+        path = self.directory / name
+        if not path.exists():
+            write_atomic(path, data)
+        with self._lock:
+            self.fetched += 1
+            self.bytes_fetched += len(response.content)
+        return name
+
+    def _save_index(self):
+        write_json_atomic(self.index_path, self.index)
+
+    def evict(self, keep=()):
+        """Delete least recently used thumbnails (except paths in `keep`) while over max_bytes"""
+        keep = set(keep)
+        entries = []
+        for path in self.directory.iterdir():
+            if path == self.index_path or path.suffix == ".tmp":
+                continue
+            stat = path.stat()
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = set()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path in keep:
+                continue
+            path.unlink()
+            removed.add(path.name)
+            total -= size
+        if removed:
+            self.index = {key: name for key, name in self.index.items() if name not in removed}
+            self._save_index()
+        return len(removed)
+
+    def stats(self):
+        return {"fetched": self.fetched, "failed": self.failed, "bytes_fetched": self.bytes_fetched,
+                "cached": len(self.index)}
+
+
+def localize_images(table, cache, report_dir="."):
+    """Point the table's model images at local thumbnails; returns how many were replaced.
+
+    Only the one image per model that the reports show is fetched. The cache
+    is then trimmed to its size cap, sparing the thumbnails just linked.
+    """
+    urls = [url for models in table.model_images().values() for url in models.values()]
+    paths = cache.fetch_all(urls)
+    cache.evict(keep=paths.values())
+    local = {url: Path(os.path.relpath(path, report_dir)).as_posix() for url, path in paths.items()}
+    table.image_url = [local.get(url, url) for url in table.image_url]
+    table._cache.clear()
+    return len(local)
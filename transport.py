@@ -0,0 +1,118 @@
+"""
+Pooled HTTP transport for the Bilbasen scraper.
+
+Provides a requests.Session whose adapter keeps connections alive across
+pages and searches, and records connect / TLS / time-to-first-byte timings
+for every request so the effect of connection reuse can be measured.
+"""
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+_timings = threading.local()
+
+
+def reset_timings():
+    """Clear the connection timings collected on the current thread"""
+    _timings.tcp = 0.0
+    _timings.handshake = 0.0
+    _timings.new_connections = 0
+
+
+def _add_timing(name, value):
+    setattr(_timings, name, getattr(_timings, name, 0) + value)
+
+
+class _TimedConnectionMixin:
+    # _new_conn opens the TCP socket; connect() also performs the TLS
+    # handshake for HTTPS, so TLS time is connect() minus _new_conn().
+    def _new_conn(self):
+        start = time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            _add_timing("tcp", time.perf_counter() - start)
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            _add_timing("handshake", time.perf_counter() - start)
+            _add_timing("new_connections", 1)
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimingHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose pooled connections report connect and TLS timings"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+
+def create_session(pool_size=10):
+    """Create a keep-alive session with room for `pool_size` connections per host"""
+    session = requests.Session()
+    adapter = TimingHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def request_timings(response):
+    """Timings (in seconds) for the request that produced `response` on this thread.
+
+    Call reset_timings() before sending the request. `connect` and `tls`
+    are zero when a pooled connection was reused.
+    """
+    tcp = getattr(_timings, "tcp", 0.0)
+    handshake = getattr(_timings, "handshake", 0.0)
+    elapsed = response.elapsed.total_seconds()
+    return {
+        "connect": tcp,
+        "tls": max(handshake - tcp, 0.0),
+        "ttfb": max(elapsed - handshake, 0.0),
+        "elapsed": elapsed,
+        "reused": getattr(_timings, "new_connections", 0) == 0,
+    }
+
+
+def summarize_timings(timings):
+    """Aggregate a list of request_timings() dicts for logging"""
+    if not timings:
+        return None
+    count = len(timings)
+    reused = sum(1 for t in timings if t["reused"])
+    return {
+        "requests": count,
+        "reused_connections": reused,
+        "new_connections": count - reused,
+        "avg_connect_ms": 1000 * sum(t["connect"] for t in timings) / count,
+        "avg_tls_ms": 1000 * sum(t["tls"] for t in timings) / count,
+        "avg_ttfb_ms": 1000 * sum(t["ttfb"] for t in timings) / count,
+        "total_handshake_s": sum(t["connect"] + t["tls"] for t in timings),
+    }